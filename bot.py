@@ -1,30 +1,83 @@
 import os
 import asyncio
 import logging
+import multiprocessing
+import signal
+import socket
+from multiprocessing.connection import wait
 
 from dotenv import load_dotenv
 load_dotenv()
 
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 from aiohttp import web, ClientSession
 
 import db
+import metrics
+import outbox
+import reencrypt
+from fsm_storage import PostgresStorage
+from scheduler import UpdateScheduler
+from middlewares import (
+    BlockedUserMiddleware, FSMFlushMiddleware, HandlerNameMiddleware, MetricsMiddleware,
+)
 from handlers import admin, user, inline
 
 BOT_TOKEN = os.environ["BOT_TOKEN"]
+# Lokal yuklama sinovi uchun (tools.fake_telegram); bo'sh — api.telegram.org
+TELEGRAM_API_URL = os.environ.get("TELEGRAM_API_URL", "")
 RENDER_URL = os.environ.get("RENDER_EXTERNAL_URL", "")
 PORT = int(os.environ.get("PORT", 10000))
 IS_RENDER = bool(RENDER_URL)
-
-bot = Bot(token=BOT_TOKEN)
-dp = Dispatcher()
+# Webhook rejimida jarayonlar soni (har biri o'z event loop i va pool i bilan)
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", 1))
+# postgres — bir nechta worker va restartlar uchun; memory — lokal
+FSM_STORAGE = os.environ.get(
+    "FSM_STORAGE", "postgres" if IS_RENDER or WEB_CONCURRENCY > 1 else "memory"
+)
+# Xotiradagi holatni boshqa jarayonlar/instance'lar bilan LISTEN/NOTIFY orqali
+# sinxronlash — bazaga bir nechta jarayon yozsa kerak. Fleet da avtomatik; bir
+# nechta instance (load balancer ortida) bo'lsa DB_SYNC=1 qo'ying. Yoqilganda
+# FSM holati har update da bazadan o'qiladi (jarayonlararo to'g'ri bo'lishi uchun)
+DB_SYNC = os.environ.get("DB_SYNC", "1" if WEB_CONCURRENCY > 1 else "0") == "1"
+# /metrics uchun lokal port (standart 0 — o'chirilgan; masalan 9100): polling
+# rejimida shu port, fleet da har worker METRICS_PORT + worker raqami
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 0))
+# Webhook: update'ni darhol tasdiqlab, fonda per-user tartibda bajarish (standart 0 —
+# aiogram: javob handler tugagach). Yoqilganda: restart/deploy da close() vaqtidan
+# (10 s) keyin navbatda qolgan update'lar yo'qoladi — Telegram ularni qayta yubormaydi
+WEBHOOK_SCHEDULER = os.environ.get("WEBHOOK_SCHEDULER", "0") == "1"
+
+bot = Bot(
+    token=BOT_TOKEN,
+    session=AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL))
+    if TELEGRAM_API_URL else None,
+)
+storage = PostgresStorage(shared=DB_SYNC) if FSM_STORAGE == "postgres" else MemoryStorage()
+dp = Dispatcher(storage=storage)
+dp.update.outer_middleware(MetricsMiddleware())
+dp.message.middleware(HandlerNameMiddleware())
+dp.callback_query.middleware(HandlerNameMiddleware())
+dp.inline_query.middleware(HandlerNameMiddleware())
+if FSM_STORAGE == "postgres":
+    dp.update.outer_middleware(FSMFlushMiddleware())
+dp.update.outer_middleware(BlockedUserMiddleware())
 
 dp.include_router(admin.router)
 dp.include_router(user.router)
 dp.include_router(inline.router)
 
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(name)s [db %(db_queries)d q, %(db_ms).1f ms] %(message)s",
+)
+for log_handler in logging.getLogger().handlers:
+    log_handler.addFilter(db.QueryStatsFilter())
 
 
 # --- Self-ping (Render uxlamasligi uchun) ---
@@ -54,13 +107,26 @@ async def stop_self_ping(app):
 # --- Webhook (Render) ---
 
 async def on_startup_webhook(app):
-    await db.init_db()
-    webhook_url = f"{RENDER_URL}/webhook"
-    await bot.set_webhook(webhook_url)
-    logging.info(f"Webhook set: {webhook_url}")
+    await db.init_db(workers=app["workers"], sync=DB_SYNC)
+    outbox.resize(app["workers"])
+    if app["workers"] > 1 and METRICS_PORT:
+        app["metrics_runner"] = await metrics.start_server(
+            METRICS_HOST, METRICS_PORT + app["worker"]
+        )
+    # Fleet da webhook ni faqat birinchi worker o'rnatadi
+    if app["worker"] == 0:
+        webhook_url = f"{RENDER_URL}/webhook"
+        await bot.set_webhook(webhook_url)
+        logging.info(f"Webhook set: {webhook_url}")
+        reencrypt.start(bot, admin.SUPER_ADMIN_ID)
 
 
 async def on_shutdown_webhook(app):
+    await reencrypt.stop()
+    await outbox.drain()
+    if "metrics_runner" in app:
+        await app["metrics_runner"].cleanup()
+    await storage.close()
     await db.close_db()
     await bot.session.close()
 
@@ -69,37 +135,107 @@ async def health(request):
     return web.Response(text="ok")
 
 
-def run_webhook():
+def run_webhook(sock: socket.socket | None = None, worker: int = 0, workers: int = 1):
     app = web.Application()
+    app["worker"] = worker
+    app["workers"] = workers
+    if workers > 1:
+        metrics.set_worker(worker)
     app.on_startup.append(on_startup_webhook)
-    app.on_startup.append(start_self_ping)
-    app.on_shutdown.append(stop_self_ping)
+    if worker == 0:
+        app.on_startup.append(start_self_ping)
+        app.on_shutdown.append(stop_self_ping)
     app.on_shutdown.append(on_shutdown_webhook)
 
     app.router.add_get("/health", health)
-
-    handler = SimpleRequestHandler(dispatcher=dp, bot=bot)
-    handler.register(app, path="/webhook")
+    app.router.add_get("/metrics", metrics.handle)
+
+    if WEBHOOK_SCHEDULER:
+        scheduler = UpdateScheduler(
+            dp, bot,
+            workers=int(os.environ.get("SCHEDULER_WORKERS", 16)),
+            max_pending=int(os.environ.get("SCHEDULER_MAX_PENDING", 1000)),
+            enqueue_timeout=float(os.environ.get("SCHEDULER_ENQUEUE_TIMEOUT", 5)),
+            user_lock=db.user_lock,
+        )
+        app.router.add_post("/webhook", scheduler.handle)
+        app.on_startup.append(lambda app: scheduler.start())
+        # on_shutdown_webhook dan oldin: navbatdagilar pool yopilmasdan tugasin
+        app.on_shutdown.insert(0, lambda app: scheduler.close())
+    else:
+        handler = SimpleRequestHandler(dispatcher=dp, bot=bot)
+        handler.register(app, path="/webhook")
     setup_application(app, dp, bot=bot)
 
-    web.run_app(app, host="0.0.0.0", port=PORT)
+    if sock is not None:
+        web.run_app(app, sock=sock, print=None)
+    else:
+        web.run_app(app, host="0.0.0.0", port=PORT)
+
+
+def run_webhook_fleet(workers: int):
+    """PORT ni ochib, `workers` ta jarayonni fork qilish (socket umumiy).
+    Bitta worker tushsa — qolganlari to'xtatiladi (Render qayta ishga tushiradi)."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("0.0.0.0", PORT))
+    sock.listen(1024)
+    sock.set_inheritable(True)
+
+    ctx = multiprocessing.get_context("fork")
+    procs = [
+        ctx.Process(target=run_webhook, args=(sock, i, workers), name=f"worker-{i}")
+        for i in range(workers)
+    ]
+    for p in procs:
+        p.start()
+    logging.info(f"Webhook fleet: {workers} workers on port {PORT}")
+
+    def stop(signum, frame):
+        for p in procs:
+            if p.is_alive():
+                os.kill(p.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    wait([p.sentinel for p in procs])
+    stop(None, None)
+    for p in procs:
+        p.join()
+    sock.close()
+    raise SystemExit(max(abs(p.exitcode or 0) for p in procs))
 
 
 # --- Polling (lokal) ---
 
 async def run_polling():
-    await db.init_db()
+    await db.init_db(sync=DB_SYNC)
     await bot.delete_webhook(drop_pending_updates=True)
+    reencrypt.start(bot, admin.SUPER_ADMIN_ID)
+    metrics_runner = None
+    if METRICS_PORT:
+        metrics_runner = await metrics.start_server(METRICS_HOST, METRICS_PORT)
     logging.info("Polling mode started")
     try:
         await dp.start_polling(bot)
     finally:
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        await reencrypt.stop()
+        await outbox.drain()
+        await storage.close()
         await db.close_db()
         await bot.session.close()
 
 
 if __name__ == "__main__":
-    if IS_RENDER:
+    if IS_RENDER and WEB_CONCURRENCY > 1:
+        # Bitta userning update'lari jarayonlararo bir vaqtda bajarilmasligi (FSM)
+        # scheduler + user_lock (DB_SYNC) bilan; tartib esa faqat jarayon ichida
+        if not (WEBHOOK_SCHEDULER and DB_SYNC):
+            raise SystemExit("WEB_CONCURRENCY > 1 uchun WEBHOOK_SCHEDULER=1 va DB_SYNC=1 kerak")
+        run_webhook_fleet(WEB_CONCURRENCY)
+    elif IS_RENDER:
         run_webhook()
     else:
         asyncio.run(run_polling())
@@ -0,0 +1,65 @@
+"""Oddiy xotiradagi LRU + TTL kesh (faqat RAM, diskka hech narsa yozilmaydi)"""
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUCache:
+    def __init__(self, max_size: int, ttl: float | None = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()  # key -> (value, expires_at)
+
+    def get(self, key, default=None, valid=None):
+        """valid(value) yolg'on bo'lsa (masalan eski versiya) — yozuv o'chiriladi, miss"""
+        item = self._data.get(key, _MISSING)
+        if item is _MISSING:
+            self.misses += 1
+            return default
+        value, expires_at = item
+        if (
+            expires_at is not None and expires_at < time.monotonic()
+            or valid is not None and not valid(value)
+        ):
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        if self.max_size <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def pop(self, key):
+        self._data.pop(key, None)
+
+    def discard_if(self, predicate):
+        """predicate(key) rost bo'lgan barcha yozuvlarni o'chirish"""
+        for key in [k for k in self._data if predicate(k)]:
+            del self._data[key]
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
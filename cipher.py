@@ -0,0 +1,108 @@
+"""Karta raqamlarini shifrlash: AEAD + kalit versiyasi (BYTEA).
+
+Format: [algoritm 1 bayt][kalit versiyasi 2 bayt][nonce 12 bayt][shifrmatn + tag 16 bayt].
+16 xonali karta — 47 bayt (Fernet tokeni ~120 belgili matn edi). Header
+associated data sifatida tekshiriladi.
+
+Kalitlar (MultiFernet kabi): CARD_KEYS="2:<base64 32 bayt>,1:<...>" —
+birinchisi bilan shifrlanadi, hammasi bilan ochiladi. 1-versiya CARD_KEYS da
+berilmasa — ENCRYPTION_KEY dan hosil qilinadi va doim ochish uchun qoladi
+(CARD_KEYS="2:..." qo'yilganda eski tokenlar o'qilib, qayta shifrlanadi).
+Algoritm: CARD_CIPHER
+(aes-gcm | chacha20-poly1305); ochishda tokendagi algoritm ishlatiladi.
+
+Eski Fernet tokenlari (ENCRYPTION_KEY) va shifrlanmagan eski kartalar ham o'qiladi.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import struct
+
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+
+ALGORITHMS = {1: AESGCM, 2: ChaCha20Poly1305}
+ALGORITHM_NAMES = {"aes-gcm": 1, "chacha20-poly1305": 2}
+
+_HEADER = struct.Struct(">BH")  # algoritm, kalit versiyasi
+NONCE_SIZE = 12
+TAG_SIZE = 16
+
+# Ochilmagan karta o'rniga ko'rsatiladi (kalit yo'q yoki token buzilgan)
+UNREADABLE = "?" * 16
+DECRYPT_ERRORS = (InvalidTag, ValueError)
+
+
+def config_from_env() -> dict:
+    """Oddiy dict (bytes) — process pool workerlariga ham shu beriladi"""
+    fernet_key = os.environ["ENCRYPTION_KEY"].encode()
+    keys = {}
+    for item in os.environ.get("CARD_KEYS", "").split(","):
+        if not item.strip():
+            continue
+        version, key = item.strip().split(":", 1)
+        keys[int(version)] = base64.urlsafe_b64decode(key)
+    # Hosil qilingan 1-versiya: CARD_KEYS siz shifrlangan tokenlar uchun
+    keys.setdefault(1, hmac.new(fernet_key, b"card_aead", hashlib.sha256).digest())
+    name = os.environ.get("CARD_CIPHER", "aes-gcm")
+    if name not in ALGORITHM_NAMES:
+        raise ValueError(f"CARD_CIPHER noto'g'ri: {name} ({', '.join(ALGORITHM_NAMES)})")
+    return {
+        "algorithm": ALGORITHM_NAMES[name],
+        "current": next(iter(keys)),
+        "keys": keys,
+        "fernet_key": fernet_key,
+    }
+
+
+class CardCipher:
+    def __init__(self, config: dict):
+        self.algorithm = config["algorithm"]
+        self.current = config["current"]
+        self.keys = config["keys"]
+        # Joriy tokenlar shu 3 bayt bilan boshlanadi (SQL da filtrlash uchun ham)
+        self.header = _HEADER.pack(self.algorithm, self.current)
+        for version, key in self.keys.items():
+            if not 0 < version < 2 ** 16:
+                raise ValueError(f"Kalit versiyasi 1..65535 bo'lishi kerak: {version}")
+            if len(key) != 32:
+                raise ValueError(f"{version}-versiya kaliti 32 bayt bo'lishi kerak")
+        self.fernet = Fernet(config["fernet_key"])
+        self._aeads: dict[tuple[int, int], object] = {}
+
+    def _aead(self, algorithm: int, version: int):
+        aead = self._aeads.get((algorithm, version))
+        if aead is None:
+            key = self.keys.get(version)
+            if key is None:
+                raise ValueError(f"Noma'lum kalit versiyasi: {version}")
+            aead = self._aeads[(algorithm, version)] = ALGORITHMS[algorithm](key)
+        return aead
+
+    def encrypt(self, card_number: str) -> bytes:
+        nonce = os.urandom(NONCE_SIZE)
+        aead = self._aead(self.algorithm, self.current)
+        return self.header + nonce + aead.encrypt(nonce, card_number.encode(), self.header)
+
+    def decrypt(self, data: bytes) -> str:
+        if is_aead(data):
+            header = data[:_HEADER.size]
+            nonce = data[_HEADER.size:_HEADER.size + NONCE_SIZE]
+            aead = self._aead(*_HEADER.unpack(header))
+            return aead.decrypt(nonce, data[_HEADER.size + NONCE_SIZE:], header).decode()
+        # Eski format: Fernet tokeni yoki shifrlanmagan karta
+        try:
+            return self.fernet.decrypt(data).decode()
+        except InvalidToken:
+            return data.decode()
+
+    def is_current(self, data: bytes) -> bool:
+        """Joriy algoritm va kalit bilan shifrlanganmi (aks holda — qayta shifrlash kerak)"""
+        return is_aead(data) and data[:_HEADER.size] == self.header
+
+
+def is_aead(data: bytes) -> bool:
+    # Fernet tokeni "gAAAA..." (0x67), eski karta — raqamlar: 1/2 bilan to'qnashmaydi
+    return len(data) >= _HEADER.size + NONCE_SIZE + TAG_SIZE and data[0] in ALGORITHMS
@@ -0,0 +1,120 @@
+"""Katta decrypt batch'lari uchun process pool.
+
+Decrypt — sof CPU ish; minglab kartani event loop da ochish
+boshqa userlarning update'larini to'xtatib qo'yadi. THRESHOLD dan katta
+batch'lar CHUNK bo'laklarga bo'linib process pool'ga beriladi (kalit har
+bir workerda bir marta yuklanadi), natija kirish tartibida qaytadi.
+Kichik batch'lar IPC narxini to'lamasligi uchun shu joyda ochiladi.
+
+Workerlar "spawn" bilan ishga tushadi: har biri asosiy modulni (bot.py,
+__mp_main__ sifatida) qayta import qiladi — db, aiogram, handlerlar ham
+yuklanadi (`if __name__ == "__main__"` qismi ishlamaydi). Shuning uchun pool
+birinchi katta batch da ochiladi va kichik. Pool buzilsa (worker o'ldirilgan
+va h.k.) — batch threadda ochiladi, keyingisida pool qayta yaratiladi.
+
+CRYPTO_POOL_WORKERS — bitta bot jarayonidagi workerlar (0 — pool o'chiq).
+CRYPTO_POOL_BUDGET — barcha bot jarayonlari uchun jami (standart: CPU soni);
+har jarayon ko'pi bilan budget // WEB_CONCURRENCY oladi (DB_POOL_BUDGET kabi).
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import metrics
+from cipher import DECRYPT_ERRORS, UNREADABLE, CardCipher
+
+WORKERS = int(os.environ.get("CRYPTO_POOL_WORKERS", min(4, os.cpu_count() or 1)))
+BUDGET = int(os.environ.get("CRYPTO_POOL_BUDGET", os.cpu_count() or 1))
+THRESHOLD = int(os.environ.get("CRYPTO_POOL_THRESHOLD", 500))
+CHUNK = int(os.environ.get("CRYPTO_POOL_CHUNK", 1000))
+
+decrypted_total = metrics.Counter(
+    "crypto_decrypted_total", "Ochilgan kartalar (inline, thread yoki process pool)", ("path",)
+)
+
+_config: dict | None = None
+_cipher: CardCipher | None = None  # shu jarayondagi (asosiy yoki worker) kalitlar
+_executor: ProcessPoolExecutor | None = None
+
+
+def configure(config: dict):
+    """Asosiy jarayonda: kalitlarni o'rnatish (workerlar initializer orqali oladi)"""
+    global _config, _cipher
+    _config = config
+    _cipher = CardCipher(config)
+
+
+def resize(workers: int = 1):
+    """Bot jarayonlari soniga qarab: jami workerlar BUDGET dan oshmasin"""
+    global WORKERS
+    if BUDGET:
+        WORKERS = min(WORKERS, BUDGET // workers)
+
+
+def _init_worker(config: dict):
+    global _cipher
+    _cipher = CardCipher(config)
+
+
+def _decrypt_one(token: bytes) -> str:
+    try:
+        return _cipher.decrypt(token)
+    except DECRYPT_ERRORS as e:
+        # Bitta buzilgan token butun ro'yxatni yiqitmasin
+        logging.warning(f"Kartani ochib bo'lmadi: {type(e).__name__} {e}")
+        return UNREADABLE
+
+
+def _decrypt_chunk(tokens: list[bytes]) -> list[str]:
+    return [_decrypt_one(t) for t in tokens]
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(_config,),
+        )
+        logging.info(f"Crypto pool: {WORKERS} ta worker")
+    return _executor
+
+
+async def decrypt_many(tokens: list[bytes]) -> list[str]:
+    """Kartalarni ochish; natija `tokens` tartibida"""
+    if len(tokens) < THRESHOLD or WORKERS <= 0:
+        decrypted_total.inc("inline", amount=len(tokens))
+        return _decrypt_chunk(tokens)
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+    try:
+        chunks = await asyncio.gather(*(
+            loop.run_in_executor(executor, _decrypt_chunk, tokens[i:i + CHUNK])
+            for i in range(0, len(tokens), CHUNK)
+        ))
+    except BrokenProcessPool:
+        logging.exception("Crypto pool buzildi, keyingi batch da qayta yaratiladi")
+        _reset(executor)
+        decrypted_total.inc("thread", amount=len(tokens))
+        return await asyncio.to_thread(_decrypt_chunk, tokens)
+    decrypted_total.inc("pool", amount=len(tokens))
+    return [number for chunk in chunks for number in chunk]
+
+
+def _reset(executor: ProcessPoolExecutor):
+    global _executor
+    if _executor is executor:
+        _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -1,28 +1,467 @@
 import os
+import asyncio
+import hmac
+import hashlib
+import logging
+import time
+import uuid
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import NamedTuple
+
 import asyncpg
-from cryptography.fernet import Fernet
+from cryptography.fernet import InvalidToken
+
+import cipher
+import crypto_pool
+import metrics
+import search_index
+from cache import LRUCache
+
+
+# Shundan sekin so'rovlar log ga yoziladi (parametrlar yashirilgan)
+SLOW_QUERY_MS = float(os.environ.get("DB_SLOW_QUERY_MS", 200))
+
+
+class QueryStats:
+    __slots__ = ("queries", "seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+
+# Joriy update davomidagi so'rovlar soni va vaqti (MetricsMiddleware o'rnatadi)
+query_stats: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+
+class QueryStatsFilter(logging.Filter):
+    """Log yozuvlariga joriy update dagi db_queries va db_ms ni qo'shadi"""
+
+    def filter(self, record):
+        stats = query_stats.get()
+        record.db_queries = stats.queries if stats else 0
+        record.db_ms = stats.seconds * 1000 if stats else 0.0
+        return True
+
+
+def _redact(args) -> str:
+    """Sonlar (id lar) ko'rinadi; matn/bytes (karta raqami, hash, FIO) — yo'q"""
+    if isinstance(args, list):
+        return f"<{len(args)} rows>"
+    return ", ".join(
+        repr(a) if a is None or isinstance(a, (int, float)) else f"<{type(a).__name__}>"
+        for a in args
+    )
+
+
+def _record_query(name: str, query: str, args, elapsed: float):
+    metrics.db_query_seconds.observe(elapsed, name)
+    stats = query_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.seconds += elapsed
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        logging.warning(
+            f"Sekin so'rov {name} ({elapsed * 1000:.0f} ms): "
+            f"{' '.join(query.split())} | params: {_redact(args)}"
+        )
+
+
+class TimedConnection:
+    """asyncpg.Connection ustidan: har bir so'rov vaqti `name` bilan metrikaga
+    yoziladi (sekinlari — parametrlari yashirilgan holda log ga)"""
+
+    def __init__(self, conn: asyncpg.Connection, name: str):
+        self._conn = conn
+        self._name = name
+
+    async def _run(self, method: str, query: str, args):
+        start = time.perf_counter()
+        try:
+            if method == "executemany":
+                return await self._conn.executemany(query, args)
+            return await getattr(self._conn, method)(query, *args)
+        finally:
+            _record_query(self._name, query, args, time.perf_counter() - start)
+
+    async def execute(self, query: str, *args):
+        return await self._run("execute", query, args)
+
+    async def executemany(self, query: str, args):
+        return await self._run("executemany", query, args)
 
-pool: asyncpg.Pool | None = None
-fernet = Fernet(os.environ["ENCRYPTION_KEY"].encode())
+    async def fetch(self, query: str, *args):
+        return await self._run("fetch", query, args)
 
+    async def fetchrow(self, query: str, *args):
+        return await self._run("fetchrow", query, args)
 
-def encrypt_card(card_number: str) -> str:
-    return fernet.encrypt(card_number.encode()).decode()
+    async def fetchval(self, query: str, *args):
+        return await self._run("fetchval", query, args)
 
+    def __getattr__(self, name):
+        # transaction, copy_records_to_table, ... — to'g'ridan-to'g'ri asyncpg ga
+        return getattr(self._conn, name)
 
-def decrypt_card(encrypted: str) -> str:
-    return fernet.decrypt(encrypted.encode()).decode()
 
+class TimedPool:
+    """asyncpg.Pool ustidan: ulanish kutish va har bir so'rov vaqti metrikaga
+    yoziladi. `name` — so'rov nomi (odatda chaqirgan funksiya: get_cards, ...)"""
 
-async def init_db():
-    global pool
-    pool = await asyncpg.create_pool(
-        os.environ["DATABASE_URL"], min_size=1, max_size=5,
-        statement_cache_size=0
+    def __init__(self, pool: asyncpg.Pool):
+        self._pool = pool
+
+    @asynccontextmanager
+    async def acquire(self, name: str = "other"):
+        start = time.perf_counter()
+        async with self._pool.acquire() as conn:
+            metrics.db_acquire_seconds.observe(time.perf_counter() - start)
+            yield TimedConnection(conn, name)
+
+    async def execute(self, query: str, *args, name: str = "other"):
+        async with self.acquire(name) as conn:
+            return await conn.execute(query, *args)
+
+    async def executemany(self, query: str, args, name: str = "other"):
+        async with self.acquire(name) as conn:
+            return await conn.executemany(query, args)
+
+    async def fetch(self, query: str, *args, name: str = "other"):
+        async with self.acquire(name) as conn:
+            return await conn.fetch(query, *args)
+
+    async def fetchrow(self, query: str, *args, name: str = "other"):
+        async with self.acquire(name) as conn:
+            return await conn.fetchrow(query, *args)
+
+    async def fetchval(self, query: str, *args, name: str = "other"):
+        async with self.acquire(name) as conn:
+            return await conn.fetchval(query, *args)
+
+    def __getattr__(self, name):
+        # close, get_size, get_idle_size, ... — to'g'ridan-to'g'ri asyncpg ga
+        return getattr(self._pool, name)
+
+
+pool: TimedPool | None = None
+_cipher_config = cipher.config_from_env()
+card_cipher = cipher.CardCipher(_cipher_config)
+crypto_pool.configure(_cipher_config)
+
+# Blind index kaliti: alohida berilmasa ENCRYPTION_KEY dan hosil qilinadi.
+# O'zgartirilsa card_hash ustunini qayta hisoblash kerak.
+_card_hash_key = os.environ.get("CARD_HASH_KEY", "").encode() or hmac.new(
+    os.environ["ENCRYPTION_KEY"].encode(), b"card_hash", hashlib.sha256
+).digest()
+
+# Bloklangan userlar — init_db da yuklanadi, block/unblock da yangilanadi
+blocked_ids: set[int] = set()
+
+# Ma'lumot versiyalari — yozishda oshadi (inline natijalar keshi uchun)
+data_version = 0
+org_versions: dict[int, int] = {}
+user_versions: dict[int, int] = {}
+
+# Ochilgan karta raqamlari keshi: card_id -> raqam (faqat xotirada)
+card_cache = LRUCache(
+    max_size=int(os.environ.get("CARD_CACHE_SIZE", 100_000)),
+    ttl=float(os.environ.get("CARD_CACHE_TTL", 3600)),
+)
+
+
+# (org_id, telegram_id) -> tashkilot rowi + is_member (rol aniqlash uchun)
+access_cache = LRUCache(
+    max_size=int(os.environ.get("ACCESS_CACHE_SIZE", 10_000)),
+    ttl=float(os.environ.get("ACCESS_CACHE_TTL", 60)),
+)
+
+
+# Ro'yxat ekranlari (tugmali ro'yxatlar) uchun sahifa hajmi
+LIST_PAGE_SIZE = int(os.environ.get("LIST_PAGE_SIZE", 20))
+
+
+class Page(NamedTuple):
+    rows: list
+    has_prev: bool
+    has_next: bool
+
+
+def _page(rows, limit: int, after: int, before: int) -> Page:
+    """limit + 1 ta olingan qatorlardan sahifa (before bo'lsa teskari tartibda kelgan)"""
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if before:
+        return Page(rows[::-1], more, True)
+    return Page(rows, after > 0, more)
+
+metrics.register_cache("card", card_cache)
+metrics.register_cache("access", access_cache)
+metrics.register_gauge(
+    "db_pool_size", "Pooldagi ochiq ulanishlar", lambda: pool.get_size() if pool else 0
+)
+metrics.register_gauge(
+    "db_pool_idle", "Pooldagi bo'sh ulanishlar", lambda: pool.get_idle_size() if pool else 0
+)
+metrics.register_gauge(
+    "db_pool_max_size", "Pool max_size", lambda: pool.get_max_size() if pool else 0
+)
+
+
+def _touch_org(org_id: int, publish: bool = True):
+    global data_version
+    data_version += 1
+    org_versions[org_id] = org_versions.get(org_id, 0) + 1
+    if publish:
+        _publish("org", org_id)
+
+
+def _touch_user(telegram_id: int, publish: bool = True):
+    global data_version
+    data_version += 1
+    user_versions[telegram_id] = user_versions.get(telegram_id, 0) + 1
+    if publish:
+        _publish("user", telegram_id)
+
+
+# --- Jarayonlararo sinxronlash (fleet yoki bir nechta instance) ---
+# Xotiradagi holat (bloklanganlar, indeks, keshlar) har bir workerda alohida.
+# Yozgan worker NOTIFY yuboradi, qolganlari LISTEN orqali o'zidagini yangilaydi.
+
+SYNC_CHANNEL = "team_cards_sync"
+_sync_enabled = False
+_listener: asyncpg.Connection | None = None
+_listener_io = asyncio.Lock()  # listener ulanishidagi so'rovlar (user_lock) ketma-ket
+_sync_tasks: set[asyncio.Task] = set()
+# user_lock: pg_advisory_lock(int4, int4) — migratsiyaning bigint kalitlari bilan kesishmaydi
+_USER_LOCK_NS = 72_000_002
+
+
+def _publish(kind: str, value: int):
+    if not _sync_enabled:
+        return
+    task = asyncio.create_task(
+        pool.execute(
+            "SELECT pg_notify($1, $2)", SYNC_CHANNEL, f"{os.getpid()}:{kind}:{value}",
+            name="_publish"
+        )
+    )
+    _sync_tasks.add(task)
+    task.add_done_callback(_publish_done)
+
+
+def _publish_done(task: asyncio.Task):
+    _sync_tasks.discard(task)
+    if not task.cancelled() and task.exception():
+        logging.error(f"NOTIFY yuborilmadi: {task.exception()!r}")
+
+
+def _on_sync(conn, pid, channel, payload: str):
+    sender, kind, value = payload.split(":")
+    if int(sender) == os.getpid():
+        return
+    value = int(value)
+    if kind == "block":
+        blocked_ids.add(value)
+    elif kind == "unblock":
+        blocked_ids.discard(value)
+    elif kind == "org":
+        search_index.invalidate_org(value)
+        access_cache.discard_if(lambda key: key[0] == value)
+        _touch_org(value, publish=False)
+    elif kind == "org_deleted":
+        search_index.delete_org(value)
+        access_cache.discard_if(lambda key: key[0] == value)
+        _touch_org(value, publish=False)
+    elif kind == "user":
+        search_index.invalidate_user(value)
+        access_cache.discard_if(lambda key: key[1] == value)
+        _touch_user(value, publish=False)
+
+
+def _on_listener_lost(conn):
+    # Ulanish uzilgan paytdagi xabarlar yo'qolgan bo'lishi mumkin
+    logging.warning("LISTEN ulanishi uzildi — xotiradagi holat qayta yuklanadi")
+    task = asyncio.create_task(_restart_sync())
+    _sync_tasks.add(task)
+    task.add_done_callback(_sync_tasks.discard)
+
+
+async def _start_sync():
+    global _listener
+    _listener = await asyncpg.connect(
+        os.environ.get("DB_LISTEN_URL") or os.environ["DATABASE_URL"]
     )
+    await _listener.add_listener(SYNC_CHANNEL, _on_sync)
+    _listener.add_termination_listener(_on_listener_lost)
 
+
+async def _restart_sync():
+    global data_version
+    while True:
+        try:
+            await _start_sync()
+            break
+        except (OSError, asyncpg.PostgresError) as e:
+            logging.warning(f"LISTEN qayta ulanmadi: {e!r}")
+            await asyncio.sleep(5)
+    search_index.clear()
+    for org_id in org_versions:
+        org_versions[org_id] += 1
+    for telegram_id in user_versions:
+        user_versions[telegram_id] += 1
+    data_version += 1
+    access_cache.clear()
+    await load_blocked_users()
+
+
+async def _listener_query(query: str, *args):
+    async with _listener_io:
+        return await _listener.fetchval(query, *args)
+
+
+@asynccontextmanager
+async def user_lock(telegram_id: int):
+    """Bitta userning update'lari barcha jarayonlarda bir vaqtda bajarilmasligi
+    uchun (faqat o'zaro istisno — jarayonlararo tartib kafolatlanmaydi).
+
+    Sinxronlash yoqilganda ishlaydi: listener ulanishida (to'g'ridan-to'g'ri,
+    PgBouncer siz) session advisory lock. pg_try_advisory_lock — ulanish band
+    bo'lib qolmasin. Ulanish uzilsa — qulfsiz davom etiladi (log bilan).
+    """
+    if _listener is None:
+        yield
+        return
+    key = telegram_id % 2_147_483_647
+    locked = False
+    delay = 0.005
+    try:
+        while not await _listener_query(
+            "SELECT pg_try_advisory_lock($1, $2)", _USER_LOCK_NS, key
+        ):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.1)
+        locked = True
+    except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+        logging.warning(f"user_lock {telegram_id} olinmadi: {e!r}")
+    try:
+        yield
+    finally:
+        if locked:
+            try:
+                await _listener_query("SELECT pg_advisory_unlock($1, $2)", _USER_LOCK_NS, key)
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError):
+                pass  # ulanish uzilgan — session qulflari o'zi bo'shagan
+
+
+def encrypt_card(card_number: str) -> bytes:
+    return card_cipher.encrypt(card_number)
+
+
+def decrypt_card(encrypted: bytes) -> str:
+    """AEAD, eski Fernet tokeni yoki shifrlanmagan eski karta"""
+    return card_cipher.decrypt(encrypted)
+
+
+def card_hash(card_number: str) -> bytes:
+    """Karta raqamining kalitli HMAC i — SQL da solishtirish uchun"""
+    return hmac.new(_card_hash_key, card_number.encode(), hashlib.sha256).digest()
+
+
+def _encrypt_cards(cards: list[str]) -> tuple[list[bytes], list[bytes]]:
+    return [encrypt_card(c) for c in cards], [card_hash(c) for c in cards]
+
+
+async def _card_numbers(rows, id_key: str = "card_id") -> dict[int, str]:
+    """card_id -> raqam: keshdan, qolganlari bitta batch da (katta bo'lsa process pool da)"""
+    numbers = {}
+    missing = {}
+    for row in rows:
+        card_id = row[id_key]
+        if card_id is None or card_id in numbers:
+            continue
+        card_number = card_cache.get(card_id)
+        if card_number is None:
+            missing[card_id] = row["card_number"]
+        else:
+            numbers[card_id] = card_number
+    if missing:
+        decrypted = await crypto_pool.decrypt_many(list(missing.values()))
+        for card_id, card_number in zip(missing, decrypted):
+            if card_number != cipher.UNREADABLE:
+                card_cache.set(card_id, card_number)
+            numbers[card_id] = card_number
+    return numbers
+
+
+def _pool_kwargs(workers: int = 1) -> dict:
+    """Pool sozlamalari environment dan.
+
+    DB_POOL_BUDGET — barcha workerlar pool'lari uchun jami ulanishlar
+    (standart 20): har bir worker max_size = budget // workers oladi, lekin
+    DB_POOL_MAX_SIZE dan (standart 5) oshmaydi. Sinxronlashda har worker
+    yana bitta LISTEN ulanishini ochadi.
+
+    Prepared statement keshi standart o'chiq (oldingidek, PgBouncer
+    pool_mode=transaction bilan ham ishlaydi). To'g'ridan-to'g'ri ulanishda
+    DB_STATEMENT_CACHE_SIZE=100 bilan yoqiladi. DB_PGBOUNCER=transaction —
+    har doim o'chiq. DB_PGBOUNCER=prepared — PgBouncer 1.21+
+    (max_prepared_statements) bilan: kesh yoqiq (100), nomlar har safar noyob.
+    """
+    pgbouncer = os.environ.get("DB_PGBOUNCER", "").lower()
+    max_size = int(os.environ.get("DB_POOL_MAX_SIZE", 5))
+    budget = int(os.environ.get("DB_POOL_BUDGET", 20))
+    max_size = max(1, min(max_size, budget // workers))
+    kwargs = {
+        "min_size": min(int(os.environ.get("DB_POOL_MIN_SIZE", 2)), max_size),
+        "max_size": max_size,
+        "statement_cache_size": int(os.environ.get(
+            "DB_STATEMENT_CACHE_SIZE", 100 if pgbouncer == "prepared" else 0
+        )),
+        "max_queries": int(os.environ.get("DB_MAX_QUERIES", 50_000)),
+        # 0 — bo'sh ulanishlar yopilmaydi (burst da qayta ulanish yo'q)
+        "max_inactive_connection_lifetime": float(
+            os.environ.get("DB_MAX_INACTIVE_LIFETIME", 0)
+        ),
+    }
+    if pgbouncer == "transaction":
+        kwargs["statement_cache_size"] = 0
+    elif pgbouncer == "prepared":
+        kwargs["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid.uuid4().hex}__"
+    return kwargs
+
+
+async def _prewarm_pool():
+    """min_size ta ulanishni ochib, har birida bitta so'rov (TLS + introspection)"""
+    async def warm():
+        async with pool.acquire("_prewarm_pool") as conn:
+            await conn.fetchval("SELECT 1")
+
+    await asyncio.gather(*(warm() for _ in range(pool.get_min_size())))
+
+
+async def init_db(workers: int = 1, sync: bool | None = None):
+    """sync — LISTEN/NOTIFY (bazaga bir nechta jarayon yozsa); None — workers > 1"""
+    global pool, _sync_enabled
+    crypto_pool.resize(workers)
+    pool = TimedPool(
+        await asyncpg.create_pool(os.environ["DATABASE_URL"], **_pool_kwargs(workers))
+    )
+    await migrate()
+    await _prewarm_pool()
+    if sync if sync is not None else workers > 1:
+        # load_blocked_users dan oldin — oraliqdagi o'zgarishlar yo'qolmasin
+        _sync_enabled = True
+        await _start_sync()
+    await load_blocked_users()
+
+
+# --- Migratsiyalar ---
+# Har biri faqat bir marta ishlaydi; yangi qadam faqat ro'yxat oxiriga qo'shiladi.
+
+async def _m001_base_tables(conn):
     # Bloklangan userlar
-    await pool.execute("""
+    await conn.execute("""
         CREATE TABLE IF NOT EXISTS blocked_users (
             telegram_id BIGINT PRIMARY KEY,
             blocked_at TIMESTAMP DEFAULT NOW()
@@ -30,7 +469,7 @@ async def init_db():
     """)
 
     # Tashkilotlar (owner_id bilan)
-    await pool.execute("""
+    await conn.execute("""
         CREATE TABLE IF NOT EXISTS organizations (
             id SERIAL PRIMARY KEY,
             name TEXT NOT NULL,
@@ -39,12 +478,12 @@ async def init_db():
         )
     """)
     # Migratsiya: owner_id ustuni qo'shish (eski jadval uchun)
-    await pool.execute("""
+    await conn.execute("""
         ALTER TABLE organizations ADD COLUMN IF NOT EXISTS owner_id BIGINT
     """)
 
     # Ishtirokchilar
-    await pool.execute("""
+    await conn.execute("""
         CREATE TABLE IF NOT EXISTS participants (
             id SERIAL PRIMARY KEY,
             org_id INTEGER REFERENCES organizations(id) ON DELETE CASCADE,
@@ -53,19 +492,19 @@ async def init_db():
     """)
 
     # Kartalar
-    await pool.execute("""
+    await conn.execute("""
         CREATE TABLE IF NOT EXISTS cards (
             id SERIAL PRIMARY KEY,
             participant_id INTEGER REFERENCES participants(id) ON DELETE CASCADE,
             card_number TEXT NOT NULL
         )
     """)
-    await pool.execute("""
+    await conn.execute("""
         ALTER TABLE cards ALTER COLUMN card_number TYPE TEXT
     """)
 
     # Ko'p-ga-ko'p: user <-> tashkilot
-    await pool.execute("""
+    await conn.execute("""
         CREATE TABLE IF NOT EXISTS user_orgs (
             telegram_id BIGINT NOT NULL,
             org_id INTEGER REFERENCES organizations(id) ON DELETE CASCADE,
@@ -75,109 +514,410 @@ async def init_db():
         )
     """)
 
+
+async def _m002_user_sessions(conn):
     # Eski user_sessions dan user_orgs ga migratsiya
-    exists = await pool.fetchval("""
+    exists = await conn.fetchval("""
         SELECT EXISTS (
             SELECT FROM information_schema.tables
             WHERE table_name = 'user_sessions'
         )
     """)
     if exists:
-        await pool.execute("""
+        await conn.execute("""
             INSERT INTO user_orgs (telegram_id, org_id, full_name, username)
             SELECT telegram_id, org_id, full_name, username FROM user_sessions
             ON CONFLICT DO NOTHING
         """)
-        await pool.execute("DROP TABLE IF EXISTS user_sessions")
+        await conn.execute("DROP TABLE IF EXISTS user_sessions")
+
+
+async def _m003_card_hash(conn):
+    await conn.execute("""
+        ALTER TABLE cards ADD COLUMN IF NOT EXISTS card_hash BYTEA
+    """)
 
-    # Eski shifrlanmagan kartalarni shifrlash
-    rows = await pool.fetch("SELECT id, card_number FROM cards")
+    # Eski kartalar: shifrlanmagan bo'lsa shifrlash + card_hash to'ldirish.
+    # Bu bosqichda ustun hali TEXT — Fernet formati (AEAD ga 7-migratsiyadan keyin)
+    rows = await conn.fetch("SELECT id, card_number FROM cards WHERE card_hash IS NULL")
+    updates = []
     for row in rows:
         try:
-            decrypt_card(row["card_number"])
-        except Exception:
-            encrypted = encrypt_card(row["card_number"])
-            await pool.execute(
-                "UPDATE cards SET card_number = $1 WHERE id = $2",
-                encrypted, row["id"]
-            )
+            card_number = card_cipher.fernet.decrypt(row["card_number"].encode()).decode()
+            encrypted = row["card_number"]
+        except InvalidToken:
+            card_number = row["card_number"]
+            encrypted = card_cipher.fernet.encrypt(card_number.encode()).decode()
+        updates.append((encrypted, card_hash(card_number), row["id"]))
+    if updates:
+        await conn.executemany(
+            "UPDATE cards SET card_number = $1, card_hash = $2 WHERE id = $3",
+            updates
+        )
+
+    # Unique index dan oldin eski dublikatlarni tozalash
+    await conn.execute("""
+        DELETE FROM cards a USING cards b
+        WHERE a.participant_id = b.participant_id
+          AND a.card_hash = b.card_hash AND a.id > b.id
+    """)
+    await conn.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS cards_participant_hash_idx
+        ON cards (participant_id, card_hash)
+    """)
+    await conn.execute("""
+        CREATE INDEX IF NOT EXISTS cards_card_hash_idx ON cards (card_hash)
+    """)
+
+
+async def _m004_lookup_indexes(conn):
+    # cards.participant_id — cards_participant_hash_idx ning birinchi ustuni.
+    # (org_id, id): WHERE org_id = $1 va sahifalash (id > $2 ORDER BY id) — bitta index
+    await conn.execute("""
+        CREATE INDEX IF NOT EXISTS participants_org_id_id_idx ON participants (org_id, id)
+    """)
+    await conn.execute("""
+        CREATE INDEX IF NOT EXISTS user_orgs_org_id_telegram_id_idx
+        ON user_orgs (org_id, telegram_id)
+    """)
+    await conn.execute("""
+        CREATE INDEX IF NOT EXISTS organizations_owner_id_idx ON organizations (owner_id)
+    """)
+
+
+async def _m005_fsm_storage(conn):
+    # FSM holatlari (fsm_storage.PostgresStorage): key -> state + JSON data.
+    # data da kiritilayotgan karta raqamlari bo'ladi — card_cipher bilan shifrlanadi
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS fsm_storage (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data BYTEA,
+            updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+    """)
+    await conn.execute("""
+        CREATE INDEX IF NOT EXISTS fsm_storage_updated_at_idx ON fsm_storage (updated_at)
+    """)
+
+
+async def _m006_fio_trigram(conn):
+    # Inline qidiruv uchun: fio ILIKE '%...%' ni GIN indeks bilan
+    try:
+        async with conn.transaction():
+            await conn.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except asyncpg.PostgresError:
+        logging.warning("pg_trgm o'rnatib bo'lmadi — FIO qidiruvi indekssiz ishlaydi")
+        return
+    await conn.execute("""
+        CREATE INDEX IF NOT EXISTS participants_fio_trgm_idx
+        ON participants USING gin (fio gin_trgm_ops)
+    """)
+
+
+
+async def _m007_card_bytea(conn):
+    # cipher.py: AEAD tokenlari binary. Eski Fernet tokenlari/matnlar baytlari
+    # bilan saqlanadi va o'qilaveradi (qayta shifrlash — alohida)
+    await conn.execute("""
+        ALTER TABLE cards ALTER COLUMN card_number TYPE BYTEA
+        USING convert_to(card_number, 'UTF8')
+    """)
+
+
+async def _m008_reencrypt_jobs(conn):
+    # reencrypt.py checkpointi: target — joriy token header (algoritm + kalit versiyasi)
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS reencrypt_jobs (
+            name TEXT PRIMARY KEY,
+            target BYTEA NOT NULL,
+            last_id INTEGER NOT NULL DEFAULT 0,
+            rotated BIGINT NOT NULL DEFAULT 0,
+            total BIGINT NOT NULL DEFAULT 0,
+            started_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            finished_at TIMESTAMP
+        )
+    """)
+
+
+async def _m009_card_metadata(conn):
+    # Ro'yxat ekranlari uchun (decrypt qilmasdan): oxirgi 4 raqam va kartalar soni.
+    # Eski kartalarning last4 i o'qilganda (get_card_summaries) yoki qayta shifrlashda to'ladi
+    await conn.execute("ALTER TABLE cards ADD COLUMN IF NOT EXISTS last4 TEXT")
+    await conn.execute("""
+        ALTER TABLE participants ADD COLUMN IF NOT EXISTS card_count INTEGER NOT NULL DEFAULT 0
+    """)
+    # card_count — trigger bilan (ON CONFLICT, CASCADE, COPY ham hisobga olinadi)
+    await conn.execute("""
+        CREATE OR REPLACE FUNCTION participants_card_count() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                UPDATE participants p SET card_count = p.card_count + n.cnt
+                FROM (SELECT participant_id, count(*) AS cnt FROM new_cards
+                      GROUP BY participant_id) n
+                WHERE p.id = n.participant_id;
+            ELSE
+                UPDATE participants p SET card_count = p.card_count - o.cnt
+                FROM (SELECT participant_id, count(*) AS cnt FROM old_cards
+                      GROUP BY participant_id) o
+                WHERE p.id = o.participant_id;
+            END IF;
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql
+    """)
+    await conn.execute("DROP TRIGGER IF EXISTS cards_count_insert ON cards")
+    await conn.execute("""
+        CREATE TRIGGER cards_count_insert AFTER INSERT ON cards
+        REFERENCING NEW TABLE AS new_cards
+        FOR EACH STATEMENT EXECUTE FUNCTION participants_card_count()
+    """)
+    await conn.execute("DROP TRIGGER IF EXISTS cards_count_delete ON cards")
+    await conn.execute("""
+        CREATE TRIGGER cards_count_delete AFTER DELETE ON cards
+        REFERENCING OLD TABLE AS old_cards
+        FOR EACH STATEMENT EXECUTE FUNCTION participants_card_count()
+    """)
+    await conn.execute("""
+        UPDATE participants p SET card_count = c.cnt
+        FROM (SELECT participant_id, count(*) AS cnt FROM cards GROUP BY participant_id) c
+        WHERE p.id = c.participant_id
+    """)
+
+
+MIGRATIONS = [
+    (1, "base_tables", _m001_base_tables),
+    (2, "user_sessions_to_user_orgs", _m002_user_sessions),
+    (3, "cards_card_hash", _m003_card_hash),
+    (4, "lookup_indexes", _m004_lookup_indexes),
+    (5, "fsm_storage", _m005_fsm_storage),
+    (6, "participants_fio_trigram", _m006_fio_trigram),
+    (7, "cards_card_number_bytea", _m007_card_bytea),
+    (8, "reencrypt_jobs", _m008_reencrypt_jobs),
+    (9, "card_metadata", _m009_card_metadata),
+]
+
+# Bir vaqtda ishga tushgan nusxalar migratsiyani ikki marta bajarmasligi uchun
+_MIGRATION_LOCK_ID = 72_000_001
+
+
+async def migrate():
+    """Oddiy startda — 1 ta so'rov; faqat yangi migratsiyalar bajariladi"""
+    try:
+        current = await pool.fetchval("SELECT MAX(version) FROM schema_migrations", name="migrate")
+    except asyncpg.UndefinedTableError:
+        current = None
+    if current is not None and current >= MIGRATIONS[-1][0]:
+        return
+
+    # Tranzaksiya darajasidagi lock: PgBouncer (pool_mode=transaction) da ham
+    # ishlaydi va COMMIT/ROLLBACK da o'zi bo'shaydi
+    async with pool.acquire("migrate") as conn:
+        async with conn.transaction():
+            await conn.execute("SELECT pg_advisory_xact_lock($1)", _MIGRATION_LOCK_ID)
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TIMESTAMP DEFAULT NOW()
+                )
+            """)
+        for version, name, migration in MIGRATIONS:
+            if current is not None and version <= current:
+                continue
+            async with conn.transaction():
+                await conn.execute("SELECT pg_advisory_xact_lock($1)", _MIGRATION_LOCK_ID)
+                # Lockni kutayotganda boshqa nusxa bajargan bo'lishi mumkin
+                if await conn.fetchval(
+                    "SELECT 1 FROM schema_migrations WHERE version = $1", version
+                ):
+                    continue
+                await migration(conn)
+                await conn.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES ($1, $2)",
+                    version, name
+                )
+            logging.info(f"Migration applied: {version} {name}")
 
 
 async def close_db():
-    global pool
+    global pool, _listener
+    if _listener:
+        _listener.remove_termination_listener(_on_listener_lost)
+        await _listener.close()
+        _listener = None
     if pool:
         await pool.close()
+    crypto_pool.shutdown()
 
 
 # --- Blocked Users ---
 
-async def is_blocked(telegram_id: int) -> bool:
-    row = await pool.fetchval(
-        "SELECT 1 FROM blocked_users WHERE telegram_id = $1", telegram_id
-    )
-    return row is not None
+async def load_blocked_users():
+    rows = await pool.fetch("SELECT telegram_id FROM blocked_users", name="load_blocked_users")
+    blocked_ids.clear()
+    blocked_ids.update(row["telegram_id"] for row in rows)
+
+
+def is_blocked(telegram_id: int) -> bool:
+    """Bazaga so'rovsiz — xotiradagi to'plamdan"""
+    return telegram_id in blocked_ids
 
 
 async def block_user(telegram_id: int):
     await pool.execute(
         "INSERT INTO blocked_users (telegram_id) VALUES ($1) ON CONFLICT DO NOTHING",
-        telegram_id
+        telegram_id, name="block_user"
     )
+    blocked_ids.add(telegram_id)
+    _publish("block", telegram_id)
 
 
 async def unblock_user(telegram_id: int):
     await pool.execute(
-        "DELETE FROM blocked_users WHERE telegram_id = $1", telegram_id
+        "DELETE FROM blocked_users WHERE telegram_id = $1", telegram_id, name="unblock_user"
     )
+    blocked_ids.discard(telegram_id)
+    _publish("unblock", telegram_id)
 
 
-async def get_blocked_users():
-    return await pool.fetch(
-        "SELECT * FROM blocked_users ORDER BY blocked_at DESC"
-    )
+async def get_blocked_users(after: int = 0, before: int = 0, limit: int = LIST_PAGE_SIZE) -> Page:
+    if before:
+        rows = await pool.fetch(
+            "SELECT * FROM blocked_users WHERE telegram_id < $1 "
+            "ORDER BY telegram_id DESC LIMIT $2",
+            before, limit + 1, name="get_blocked_users"
+        )
+    else:
+        rows = await pool.fetch(
+            "SELECT * FROM blocked_users WHERE telegram_id > $1 "
+            "ORDER BY telegram_id LIMIT $2",
+            after, limit + 1, name="get_blocked_users"
+        )
+    return _page(rows, limit, after, before)
 
 
 # --- Organizations ---
 
 async def create_org(name: str, unique_id: str, owner_id: int) -> int:
-    return await pool.fetchval(
+    org_id = await pool.fetchval(
         "INSERT INTO organizations (name, unique_id, owner_id) VALUES ($1, $2, $3) RETURNING id",
-        name, unique_id, owner_id
+        name, unique_id, owner_id, name="create_org"
     )
+    search_index.add_org(org_id, name)
+    _touch_org(org_id)
+    return org_id
 
 
-async def get_all_orgs():
-    return await pool.fetch("SELECT * FROM organizations ORDER BY id")
+async def get_all_orgs(after: int = 0, before: int = 0, limit: int = LIST_PAGE_SIZE) -> Page:
+    if before:
+        rows = await pool.fetch(
+            "SELECT * FROM organizations WHERE id < $1 ORDER BY id DESC LIMIT $2",
+            before, limit + 1, name="get_all_orgs"
+        )
+    else:
+        rows = await pool.fetch(
+            "SELECT * FROM organizations WHERE id > $1 ORDER BY id LIMIT $2",
+            after, limit + 1, name="get_all_orgs"
+        )
+    return _page(rows, limit, after, before)
 
 
 async def get_org(org_id: int):
-    return await pool.fetchrow("SELECT * FROM organizations WHERE id = $1", org_id)
+    return await pool.fetchrow("SELECT * FROM organizations WHERE id = $1", org_id, name="get_org")
 
 
 async def get_org_by_unique_id(unique_id: str):
-    return await pool.fetchrow("SELECT * FROM organizations WHERE unique_id = $1", unique_id)
+    return await pool.fetchrow(
+        "SELECT * FROM organizations WHERE unique_id = $1", unique_id,
+        name="get_org_by_unique_id"
+    )
 
 
 async def get_user_owned_orgs(telegram_id: int):
     return await pool.fetch(
-        "SELECT * FROM organizations WHERE owner_id = $1 ORDER BY id", telegram_id
+        "SELECT * FROM organizations WHERE owner_id = $1 ORDER BY id", telegram_id,
+        name="get_user_owned_orgs"
     )
 
 
 async def is_org_owner(telegram_id: int, org_id: int) -> bool:
     row = await pool.fetchval(
         "SELECT 1 FROM organizations WHERE id = $1 AND owner_id = $2",
-        org_id, telegram_id
+        org_id, telegram_id, name="is_org_owner"
     )
     return row is not None
 
 
 async def rename_org(org_id: int, new_name: str):
-    await pool.execute("UPDATE organizations SET name = $1 WHERE id = $2", new_name, org_id)
+    await pool.execute(
+        "UPDATE organizations SET name = $1 WHERE id = $2", new_name, org_id, name="rename_org"
+    )
+    search_index.rename_org(org_id, new_name)
+    access_cache.discard_if(lambda key: key[0] == org_id)
+    _touch_org(org_id)
 
 
 async def delete_org(org_id: int):
-    await pool.execute("DELETE FROM organizations WHERE id = $1", org_id)
+    # CTE o'chirishdan oldingi holatni ko'radi — kaskad o'chgan kartalar id si
+    card_ids = await pool.fetch(
+        """WITH d AS (DELETE FROM organizations WHERE id = $1 RETURNING id)
+           SELECT c.id FROM cards c
+           JOIN participants p ON p.id = c.participant_id
+           JOIN d ON d.id = p.org_id""",
+        org_id, name="delete_org"
+    )
+    for row in card_ids:
+        card_cache.pop(row["id"])
+    search_index.delete_org(org_id)
+    access_cache.discard_if(lambda key: key[0] == org_id)
+    _touch_org(org_id, publish=False)
+    _publish("org_deleted", org_id)
+
+
+async def get_org_access(telegram_id: int, org_id: int):
+    """Tashkilot + user a'zoligi (is_member) — 1 ta so'rov, keyin qisqa kesh"""
+    key = (org_id, telegram_id)
+    org = access_cache.get(key)
+    if org is None:
+        row = await pool.fetchrow(
+            """SELECT o.*, EXISTS (
+                   SELECT 1 FROM user_orgs uo
+                   WHERE uo.org_id = o.id AND uo.telegram_id = $2
+               ) AS is_member
+               FROM organizations o WHERE o.id = $1""",
+            org_id, telegram_id, name="get_org_access"
+        )
+        if row is None:
+            return None
+        org = dict(row)
+        access_cache.set(key, org)
+    return org
+
+
+async def get_participant_access(telegram_id: int, participant_id: int):
+    """(ishtirokchi, tashkilot + is_member) — 1 ta so'rov"""
+    row = await pool.fetchrow(
+        """SELECT p.id, p.org_id, p.fio,
+                  o.name, o.unique_id, o.owner_id,
+                  EXISTS (
+                      SELECT 1 FROM user_orgs uo
+                      WHERE uo.org_id = o.id AND uo.telegram_id = $2
+                  ) AS is_member
+           FROM participants p
+           JOIN organizations o ON o.id = p.org_id
+           WHERE p.id = $1""",
+        participant_id, telegram_id, name="get_participant_access"
+    )
+    if row is None:
+        return None, None
+    participant = {"id": row["id"], "org_id": row["org_id"], "fio": row["fio"]}
+    org = {
+        "id": row["org_id"], "name": row["name"], "unique_id": row["unique_id"],
+        "owner_id": row["owner_id"], "is_member": row["is_member"],
+    }
+    access_cache.set((row["org_id"], telegram_id), org)
+    return participant, org
 
 
 # --- User Orgs (many-to-many) ---
@@ -188,36 +928,65 @@ async def add_user_to_org(telegram_id: int, org_id: int, full_name: str = None,
            VALUES ($1, $2, $3, $4)
            ON CONFLICT (telegram_id, org_id) DO UPDATE
            SET full_name = $3, username = $4""",
-        telegram_id, org_id, full_name, username
+        telegram_id, org_id, full_name, username, name="add_user_to_org"
     )
+    search_index.add_user_to_org(telegram_id, org_id)
+    access_cache.pop((org_id, telegram_id))
+    _touch_user(telegram_id)
 
 
 async def remove_user_from_org(telegram_id: int, org_id: int):
     await pool.execute(
         "DELETE FROM user_orgs WHERE telegram_id = $1 AND org_id = $2",
-        telegram_id, org_id
-    )
-
-
-async def get_user_orgs(telegram_id: int):
-    return await pool.fetch(
-        """SELECT o.* FROM organizations o
-           JOIN user_orgs uo ON uo.org_id = o.id
-           WHERE uo.telegram_id = $1 ORDER BY o.id""",
-        telegram_id
+        telegram_id, org_id, name="remove_user_from_org"
     )
+    search_index.remove_user_from_org(telegram_id, org_id)
+    access_cache.pop((org_id, telegram_id))
+    _touch_user(telegram_id)
+
+
+async def get_user_orgs(telegram_id: int, after: int = 0, before: int = 0,
+                        limit: int = LIST_PAGE_SIZE) -> Page:
+    if before:
+        rows = await pool.fetch(
+            """SELECT o.* FROM organizations o
+               JOIN user_orgs uo ON uo.org_id = o.id
+               WHERE uo.telegram_id = $1 AND uo.org_id < $2
+               ORDER BY uo.org_id DESC LIMIT $3""",
+            telegram_id, before, limit + 1, name="get_user_orgs"
+        )
+    else:
+        rows = await pool.fetch(
+            """SELECT o.* FROM organizations o
+               JOIN user_orgs uo ON uo.org_id = o.id
+               WHERE uo.telegram_id = $1 AND uo.org_id > $2
+               ORDER BY uo.org_id LIMIT $3""",
+            telegram_id, after, limit + 1, name="get_user_orgs"
+        )
+    return _page(rows, limit, after, before)
 
 
-async def get_org_members(org_id: int):
-    return await pool.fetch(
-        "SELECT * FROM user_orgs WHERE org_id = $1 ORDER BY telegram_id", org_id
-    )
+async def get_org_members(org_id: int, after: int = 0, before: int = 0,
+                          limit: int = LIST_PAGE_SIZE) -> Page:
+    if before:
+        rows = await pool.fetch(
+            "SELECT * FROM user_orgs WHERE org_id = $1 AND telegram_id < $2 "
+            "ORDER BY telegram_id DESC LIMIT $3",
+            org_id, before, limit + 1, name="get_org_members"
+        )
+    else:
+        rows = await pool.fetch(
+            "SELECT * FROM user_orgs WHERE org_id = $1 AND telegram_id > $2 "
+            "ORDER BY telegram_id LIMIT $3",
+            org_id, after, limit + 1, name="get_org_members"
+        )
+    return _page(rows, limit, after, before)
 
 
 async def is_org_member(telegram_id: int, org_id: int) -> bool:
     row = await pool.fetchval(
         "SELECT 1 FROM user_orgs WHERE telegram_id = $1 AND org_id = $2",
-        telegram_id, org_id
+        telegram_id, org_id, name="is_org_member"
     )
     return row is not None
 
@@ -225,22 +994,61 @@ async def is_org_member(telegram_id: int, org_id: int) -> bool:
 # --- Participants ---
 
 async def create_participant(org_id: int, fio: str) -> int:
-    return await pool.fetchval(
+    participant_id = await pool.fetchval(
         "INSERT INTO participants (org_id, fio) VALUES ($1, $2) RETURNING id",
-        org_id, fio
+        org_id, fio, name="create_participant"
     )
+    search_index.add_participant(org_id, participant_id, fio)
+    _touch_org(org_id)
+    return participant_id
 
 
-async def get_participants(org_id: int):
-    return await pool.fetch(
-        "SELECT * FROM participants WHERE org_id = $1 ORDER BY id", org_id
+async def create_participant_with_cards(org_id: int, fio: str, cards: list[str]) -> int:
+    """Ishtirokchi + barcha kartalari — 1 ta so'rov (bitta tranzaksiya)"""
+    cards = list(dict.fromkeys(cards))
+    if not cards:
+        return await create_participant(org_id, fio)
+    encrypted, hashes = await asyncio.to_thread(_encrypt_cards, cards)
+    rows = await pool.fetch(
+        """WITH p AS (
+               INSERT INTO participants (org_id, fio) VALUES ($1, $2) RETURNING id
+           )
+           INSERT INTO cards (participant_id, card_number, card_hash, last4)
+           SELECT p.id, c.card_number, c.card_hash, c.last4
+           FROM p, unnest($3::bytea[], $4::bytea[], $5::text[])
+                AS c(card_number, card_hash, last4)
+           RETURNING participant_id, id, card_hash""",
+        org_id, fio, encrypted, hashes, [c[-4:] for c in cards],
+        name="create_participant_with_cards"
     )
+    participant_id = rows[0]["participant_id"]
+    search_index.add_participant(org_id, participant_id, fio)
+    _cache_new_cards(participant_id, rows, dict(zip(hashes, cards)))
+    _touch_org(org_id)
+    return participant_id
+
+
+async def get_participants(org_id: int, after: int = 0, before: int = 0,
+                           limit: int = LIST_PAGE_SIZE) -> Page:
+    if before:
+        rows = await pool.fetch(
+            "SELECT * FROM participants WHERE org_id = $1 AND id < $2 "
+            "ORDER BY id DESC LIMIT $3",
+            org_id, before, limit + 1, name="get_participants"
+        )
+    else:
+        rows = await pool.fetch(
+            "SELECT * FROM participants WHERE org_id = $1 AND id > $2 "
+            "ORDER BY id LIMIT $3",
+            org_id, after, limit + 1, name="get_participants"
+        )
+    return _page(rows, limit, after, before)
 
 
 async def get_all_participants():
     return await pool.fetch(
         "SELECT p.*, o.name AS org_name FROM participants p "
-        "JOIN organizations o ON o.id = p.org_id ORDER BY p.id"
+        "JOIN organizations o ON o.id = p.org_id ORDER BY p.id", name="get_all_participants"
     )
 
 
@@ -251,41 +1059,214 @@ async def get_participants_for_user(telegram_id: int):
            JOIN organizations o ON o.id = p.org_id
            JOIN user_orgs uo ON uo.org_id = o.id
            WHERE uo.telegram_id = $1 ORDER BY p.id""",
-        telegram_id
+        telegram_id, name="get_participants_for_user"
     )
 
 
-async def get_all_participants_with_cards():
-    """Barcha ishtirokchilar + kartalar — 1 ta so'rov (inline uchun)"""
-    rows = await pool.fetch(
-        """SELECT p.id AS pid, p.fio, o.name AS org_name,
+# --- Inline qidiruv indeksi ---
+
+async def _fetch_index_rows(org_ids: list[int]):
+    return await pool.fetch(
+        """SELECT o.id AS org_id, o.name AS org_name, p.id AS pid, p.fio,
                   c.id AS card_id, c.card_number
-           FROM participants p
-           JOIN organizations o ON o.id = p.org_id
+           FROM organizations o
+           LEFT JOIN participants p ON p.org_id = o.id
            LEFT JOIN cards c ON c.participant_id = p.id
-           ORDER BY p.id, c.id"""
+           WHERE o.id = ANY($1::int[])
+           ORDER BY o.id, p.id, c.id""",
+        org_ids, name="_fetch_index_rows"
     )
-    return _group_participants_cards(rows)
 
 
-async def get_participants_with_cards_for_user(telegram_id: int):
-    """User ishtirokchilari + kartalar — 1 ta so'rov (inline uchun)"""
-    rows = await pool.fetch(
-        """SELECT p.id AS pid, p.fio, o.name AS org_name,
+async def _fetch_all_index_rows():
+    return await pool.fetch(
+        """SELECT o.id AS org_id, o.name AS org_name, p.id AS pid, p.fio,
                   c.id AS card_id, c.card_number
-           FROM participants p
-           JOIN organizations o ON o.id = p.org_id
-           JOIN user_orgs uo ON uo.org_id = o.id
+           FROM organizations o
+           LEFT JOIN participants p ON p.org_id = o.id
            LEFT JOIN cards c ON c.participant_id = p.id
-           WHERE uo.telegram_id = $1
-           ORDER BY p.id, c.id""",
-        telegram_id
+           ORDER BY o.id, p.id, c.id""",
+        name="_fetch_all_index_rows"
+    )
+
+
+async def _count_index_cards() -> int:
+    return await pool.fetchval("SELECT COUNT(*) FROM cards", name="_count_index_cards")
+
+
+# So'ralgan org to'plami (None — hammasi) -> yuklayotgan task
+_index_loads: dict[frozenset | None, asyncio.Task] = {}
+
+
+async def _load_index_orgs(org_ids=None):
+    """Indeksda yo'q tashkilotlarni yuklash (None — hammasi). Bir xil to'plam
+    bir vaqtda bir marta yuklanadi — parallel inline so'rovlar shuni kutadi"""
+    if org_ids is not None:
+        org_ids = frozenset(org_ids)
+        if all(search_index.is_org_loaded(o) for o in org_ids):
+            return
+    task = _index_loads.get(org_ids)
+    if task is None:
+        task = _index_loads[org_ids] = asyncio.ensure_future(_index_load(org_ids))
+        task.add_done_callback(lambda t, key=org_ids: _index_load_done(key, t))
+    # Kutayotgan so'rov bekor qilinsa ham yuklash boshqalar uchun davom etadi
+    await asyncio.shield(task)
+
+
+def _index_load_done(key, task: asyncio.Task):
+    if _index_loads.get(key) is task:
+        del _index_loads[key]
+    if not task.cancelled() and task.exception():
+        logging.error(f"Qidiruv indeksi yuklanmadi: {task.exception()!r}")
+
+
+async def _index_load(org_ids: frozenset | None):
+    """Yuklash yoki decrypt paytida yozilgan orglarning (org_versions) qatorlari
+    tashlanadi va faqat ular qayta o'qiladi. So'ralgan org_ids chiqarib tashlanmaydi"""
+    if org_ids is None and not search_index.check_all_budget(await _count_index_cards()):
+        return
+    pending = org_ids
+    while True:
+        epoch = search_index.epoch()
+        versions = dict(org_versions)
+        if pending is None:
+            rows = await _fetch_all_index_rows()
+        else:
+            missing = [o for o in pending if not search_index.is_org_loaded(o)]
+            if not missing:
+                return
+            rows = await _fetch_index_rows(missing)
+        numbers = await _card_numbers(rows)
+        if epoch != search_index.epoch():
+            continue  # indeks tozalangan (LISTEN qayta ulandi) — boshidan
+        changed = {
+            row["org_id"] for row in rows
+            if org_versions.get(row["org_id"], 0) != versions.get(row["org_id"], 0)
+        }
+        rows = [
+            dict(row, card_number=numbers[row["card_id"]])
+            if row["card_id"] is not None else row
+            for row in rows
+            # Yuklanganlar joyida yangilanib boradi — ustiga yozilmaydi
+            if row["org_id"] not in changed and not search_index.is_org_loaded(row["org_id"])
+        ]
+        search_index.load_orgs(rows, org_ids)
+        if not changed:
+            return
+        if pending is None:
+            search_index.mark_stale(changed)
+            return
+        pending = changed
+
+
+async def get_user_org_ids(telegram_id: int) -> set[int]:
+    """User a'zo bo'lgan tashkilotlar id lari (birinchi martadan keyin xotiradan)"""
+    org_ids = search_index.get_user_orgs(telegram_id)
+    if org_ids is None:
+        while True:
+            version = (search_index.epoch(), user_versions.get(telegram_id, 0))
+            rows = await pool.fetch(
+                "SELECT org_id FROM user_orgs WHERE telegram_id = $1", telegram_id,
+                name="get_user_org_ids"
+            )
+            if version == (search_index.epoch(), user_versions.get(telegram_id, 0)):
+                break
+        search_index.load_user_orgs(telegram_id, [r["org_id"] for r in rows])
+        org_ids = search_index.get_user_orgs(telegram_id)
+    return org_ids
+
+
+async def inline_version(telegram_id: int, is_super: bool):
+    """Inline natijalar keshi kaliti: user ko'radigan ma'lumot o'zgarsa — o'zgaradi"""
+    if is_super:
+        return data_version
+    org_ids = await get_user_org_ids(telegram_id)
+    return (
+        user_versions.get(telegram_id, 0),
+        tuple(org_versions.get(o, 0) for o in sorted(org_ids)),
+    )
+
+
+async def search_participants_for_user(telegram_id: int, search: str,
+                                       limit: int = 50, after_id: int = 0):
+    """User ko'radigan ishtirokchilar ichidan FIO bo'yicha qidiruv (1 sahifa)"""
+    if not search_index.ENABLED:
+        return await get_participants_with_cards_page(telegram_id, search, after_id, limit)
+    org_ids = await get_user_org_ids(telegram_id)
+    await _load_index_orgs(org_ids)
+    return search_index.search(org_ids, search, limit, after_id)
+
+
+async def search_all_participants(search: str, limit: int = 50, after_id: int = 0):
+    """Super admin uchun — barcha tashkilotlar bo'yicha qidiruv (1 sahifa)"""
+    if not search_index.ENABLED:
+        return await get_all_participants_with_cards_page(search, after_id, limit)
+    if not search_index.is_all_loaded() and not search_index.is_all_over_budget():
+        await _load_index_orgs()
+    if search_index.is_all_loaded():
+        stale = search_index.stale_org_ids()
+        if stale:
+            await _load_index_orgs(stale)
+    if not search_index.is_all_loaded():
+        # Barcha kartalar SEARCH_INDEX_MAX_CARDS ga sig'maydi — keyset SQL sahifa
+        return await get_all_participants_with_cards_page(search, after_id, limit)
+    return search_index.search(search_index.all_org_ids(), search, limit, after_id)
+
+
+def _like_pattern(search: str) -> str:
+    """ILIKE uchun: '%qidiruv%' (maxsus belgilar ekranlangan)"""
+    search = search.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{search}%"
+
+
+async def get_participants_with_cards_page(telegram_id: int, search: str,
+                                           after_id: int, limit: int):
+    """Keyset sahifa: kartasi bor ishtirokchilar, id > after_id (inline uchun)"""
+    rows = await pool.fetch(
+        """WITH page AS (
+               SELECT p.id, p.fio, o.name AS org_name
+               FROM participants p
+               JOIN organizations o ON o.id = p.org_id
+               JOIN user_orgs uo ON uo.org_id = o.id
+               WHERE uo.telegram_id = $1 AND p.id > $2
+                 AND p.fio ILIKE $3
+                 AND EXISTS (SELECT 1 FROM cards c WHERE c.participant_id = p.id)
+               ORDER BY p.id LIMIT $4
+           )
+           SELECT page.id AS pid, page.fio, page.org_name,
+                  c.id AS card_id, c.card_number
+           FROM page JOIN cards c ON c.participant_id = page.id
+           ORDER BY page.id, c.id""",
+        telegram_id, after_id, _like_pattern(search), limit,
+        name="get_participants_with_cards_page"
+    )
+    return _group_participants_cards(rows, await _card_numbers(rows))
+
+
+async def get_all_participants_with_cards_page(search: str, after_id: int, limit: int):
+    """Keyset sahifa: barcha tashkilotlar (super admin inline uchun)"""
+    rows = await pool.fetch(
+        """WITH page AS (
+               SELECT p.id, p.fio, o.name AS org_name
+               FROM participants p
+               JOIN organizations o ON o.id = p.org_id
+               WHERE p.id > $1
+                 AND p.fio ILIKE $2
+                 AND EXISTS (SELECT 1 FROM cards c WHERE c.participant_id = p.id)
+               ORDER BY p.id LIMIT $3
+           )
+           SELECT page.id AS pid, page.fio, page.org_name,
+                  c.id AS card_id, c.card_number
+           FROM page JOIN cards c ON c.participant_id = page.id
+           ORDER BY page.id, c.id""",
+        after_id, _like_pattern(search), limit, name="get_all_participants_with_cards_page"
     )
-    return _group_participants_cards(rows)
+    return _group_participants_cards(rows, await _card_numbers(rows))
 
 
-def _group_participants_cards(rows):
-    """Querydan kelgan rowlarni {pid, fio, org_name, cards: [...]} ga guruh"""
+def _group_participants_cards(rows, numbers: dict[int, str]):
+    """Querydan kelgan rowlarni {pid, fio, org_name, cards: [...]} ga guruh
+    (numbers — _card_numbers(rows) natijasi)"""
     participants = {}
     for row in rows:
         pid = row["pid"]
@@ -297,67 +1278,234 @@ def _group_participants_cards(rows):
                 "cards": []
             }
         if row["card_id"] is not None:
-            try:
-                card_num = decrypt_card(row["card_number"])
-            except Exception:
-                card_num = row["card_number"]
-            participants[pid]["cards"].append(card_num)
+            participants[pid]["cards"].append(numbers[row["card_id"]])
     return list(participants.values())
 
 
 async def get_participant(participant_id: int):
-    return await pool.fetchrow("SELECT * FROM participants WHERE id = $1", participant_id)
+    return await pool.fetchrow(
+        "SELECT * FROM participants WHERE id = $1", participant_id, name="get_participant"
+    )
 
 
 async def rename_participant(participant_id: int, new_fio: str):
-    await pool.execute(
-        "UPDATE participants SET fio = $1 WHERE id = $2", new_fio, participant_id
+    org_id = await pool.fetchval(
+        "UPDATE participants SET fio = $1 WHERE id = $2 RETURNING org_id",
+        new_fio, participant_id, name="rename_participant"
     )
+    search_index.rename_participant(participant_id, new_fio)
+    if org_id is not None:
+        _touch_org(org_id)
 
 
 async def delete_participant(participant_id: int):
-    await pool.execute("DELETE FROM participants WHERE id = $1", participant_id)
+    rows = await pool.fetch(
+        """WITH d AS (DELETE FROM participants WHERE id = $1 RETURNING id, org_id)
+           SELECT d.org_id, c.id AS card_id FROM d
+           LEFT JOIN cards c ON c.participant_id = d.id""",
+        participant_id, name="delete_participant"
+    )
+    for row in rows:
+        card_cache.pop(row["card_id"])
+    search_index.delete_participant(participant_id)
+    if rows:
+        _touch_org(rows[0]["org_id"])
 
 
 # --- Cards ---
 
 async def card_exists(participant_id: int, card_number: str) -> bool:
-    """Ishtirokchida shu karta borligini tekshirish"""
-    rows = await pool.fetch(
-        "SELECT card_number FROM cards WHERE participant_id = $1", participant_id
+    """Ishtirokchida shu karta borligini tekshirish (blind index orqali)"""
+    row = await pool.fetchval(
+        "SELECT 1 FROM cards WHERE participant_id = $1 AND card_hash = $2",
+        participant_id, card_hash(card_number), name="card_exists"
+    )
+    return row is not None
+
+
+async def get_card_owners(card_number: str):
+    """Shu karta qaysi ishtirokchilarda borligi — decrypt qilmasdan"""
+    return await pool.fetch(
+        """SELECT p.*, o.name AS org_name FROM cards c
+           JOIN participants p ON p.id = c.participant_id
+           JOIN organizations o ON o.id = p.org_id
+           WHERE c.card_hash = $1 ORDER BY p.id""",
+        card_hash(card_number), name="get_card_owners"
     )
-    for row in rows:
-        try:
-            decrypted = decrypt_card(row["card_number"])
-        except Exception:
-            decrypted = row["card_number"]
-        if decrypted == card_number:
-            return True
-    return False
 
 
-async def add_card(participant_id: int, card_number: str) -> int:
+async def add_card(participant_id: int, card_number: str) -> int | None:
+    """Karta qo'shish; ishtirokchida allaqachon bo'lsa — None"""
     encrypted = encrypt_card(card_number)
-    return await pool.fetchval(
-        "INSERT INTO cards (participant_id, card_number) VALUES ($1, $2) RETURNING id",
-        participant_id, encrypted
+    row = await pool.fetchrow(
+        """INSERT INTO cards (participant_id, card_number, card_hash, last4)
+           VALUES ($1, $2, $3, $4)
+           ON CONFLICT (participant_id, card_hash) DO NOTHING
+           RETURNING id, (SELECT org_id FROM participants WHERE id = $1) AS org_id""",
+        participant_id, encrypted, card_hash(card_number), card_number[-4:], name="add_card"
+    )
+    if row is None:
+        return None
+    card_cache.set(row["id"], card_number)
+    search_index.add_card(participant_id, row["id"], card_number)
+    _touch_org(row["org_id"])
+    return row["id"]
+
+
+async def add_cards(participant_id: int, cards: list[str]) -> int:
+    """Bir nechta kartani 1 ta so'rov bilan qo'shish; qo'shilganlar soni"""
+    cards = list(dict.fromkeys(cards))
+    if not cards:
+        return 0
+    encrypted, hashes = await asyncio.to_thread(_encrypt_cards, cards)
+    rows = await pool.fetch(
+        """INSERT INTO cards (participant_id, card_number, card_hash, last4)
+           SELECT $1, c.card_number, c.card_hash, c.last4
+           FROM unnest($2::bytea[], $3::bytea[], $4::text[]) AS c(card_number, card_hash, last4)
+           ON CONFLICT (participant_id, card_hash) DO NOTHING
+           RETURNING id, card_hash,
+                     (SELECT org_id FROM participants WHERE id = $1) AS org_id""",
+        participant_id, encrypted, hashes, [c[-4:] for c in cards], name="add_cards"
     )
+    _cache_new_cards(participant_id, rows, dict(zip(hashes, cards)))
+    if rows:
+        _touch_org(rows[0]["org_id"])
+    return len(rows)
+
+
+def _cache_new_cards(participant_id: int, rows, by_hash: dict[bytes, str]):
+    """RETURNING id, card_hash rowlarini kesh va qidiruv indeksiga yozish"""
+    for row in sorted(rows, key=lambda r: r["id"]):
+        card_number = by_hash[row["card_hash"]]
+        card_cache.set(row["id"], card_number)
+        search_index.add_card(participant_id, row["id"], card_number)
 
 
 async def get_cards(participant_id: int):
     rows = await pool.fetch(
-        "SELECT * FROM cards WHERE participant_id = $1 ORDER BY id", participant_id
+        "SELECT * FROM cards WHERE participant_id = $1 ORDER BY id", participant_id,
+        name="get_cards"
     )
-    result = []
+    numbers = await _card_numbers(rows, "id")
+    return [dict(row, card_number=numbers[row["id"]]) for row in rows]
+
+
+async def get_card_summaries(participant_id: int):
+    """Kartalar: id + last4 — decrypt qilmasdan (ro'yxat va o'chirish ekranlari uchun)"""
+    rows = await pool.fetch(
+        "SELECT id, last4, card_number FROM cards WHERE participant_id = $1 ORDER BY id",
+        participant_id, name="get_card_summaries"
+    )
+    missing = [row for row in rows if row["last4"] is None]
+    if not missing:
+        return [{"id": row["id"], "last4": row["last4"]} for row in rows]
+    # 9-migratsiyadan oldingi kartalar: bir marta ochib, last4 ni yozib qo'yish
+    numbers = await _card_numbers(missing, "id")
+    last4 = {
+        card_id: number[-4:] for card_id, number in numbers.items()
+        if number != cipher.UNREADABLE
+    }
+    if last4:
+        await pool.execute(
+            """UPDATE cards c SET last4 = u.last4
+               FROM unnest($1::int[], $2::text[]) AS u(id, last4)
+               WHERE c.id = u.id AND c.last4 IS NULL""",
+            list(last4), list(last4.values()), name="get_card_summaries"
+        )
+    return [
+        {"id": row["id"], "last4": row["last4"] or last4.get(row["id"], "????")} for row in rows
+    ]
+
+
+async def delete_card(card_id: int):
+    row = await pool.fetchrow(
+        """DELETE FROM cards WHERE id = $1
+           RETURNING participant_id,
+                     (SELECT org_id FROM participants p WHERE p.id = participant_id) AS org_id""",
+        card_id, name="delete_card"
+    )
+    card_cache.pop(card_id)
+    if row is not None:
+        search_index.delete_card(row["participant_id"], card_id)
+        _touch_org(row["org_id"])
+
+
+# --- Qayta shifrlash (reencrypt.py) ---
+
+async def get_reencrypt_job():
+    return await pool.fetchrow(
+        "SELECT * FROM reencrypt_jobs WHERE name = 'cards'", name="get_reencrypt_job"
+    )
+
+
+async def start_reencrypt_job():
+    """Joriy kalit uchun job; kalit/algoritm o'zgargan bo'lsa — boshidan (total qayta sanaladi)"""
+    job = await get_reencrypt_job()
+    if job is not None and job["target"] == card_cipher.header:
+        return job
+    return await pool.fetchrow(
+        """INSERT INTO reencrypt_jobs (name, target, total)
+           VALUES ('cards', $1,
+                   (SELECT count(*) FROM cards WHERE substring(card_number FOR 3) <> $1))
+           ON CONFLICT (name) DO UPDATE SET
+               target = EXCLUDED.target, total = EXCLUDED.total, last_id = 0, rotated = 0,
+               started_at = NOW(), updated_at = NOW(), finished_at = NULL
+           RETURNING *""",
+        card_cipher.header, name="start_reencrypt_job"
+    )
+
+
+def _rotate_cards(rows) -> list[tuple[int, bytes, bytes, str]]:
+    """(id, yangi token, eski token, last4); ochilmaganlari o'tkazib yuboriladi"""
+    updates = []
     for row in rows:
-        row = dict(row)
         try:
-            row["card_number"] = decrypt_card(row["card_number"])
-        except Exception:
-            pass
-        result.append(row)
-    return result
+            card_number = card_cipher.decrypt(row["card_number"])
+        except cipher.DECRYPT_ERRORS as e:
+            logging.warning(f"Qayta shifrlash: {row['id']}-kartani ochib bo'lmadi ({e!r})")
+            continue
+        updates.append(
+            (row["id"], card_cipher.encrypt(card_number), row["card_number"], card_number[-4:])
+        )
+    return updates
 
 
-async def delete_card(card_id: int):
-    await pool.execute("DELETE FROM cards WHERE id = $1", card_id)
+async def reencrypt_batch(limit: int) -> int | None:
+    """Checkpointdan keyingi `limit` ta eski kartani joriy kalitga o'tkazish.
+    Batch va checkpoint — bitta tranzaksiyada. Qayta shifrlanganlar soni; tugagan bo'lsa None"""
+    async with pool.acquire("reencrypt_batch") as conn, conn.transaction():
+        # FOR UPDATE: bir nechta nusxa (deploy paytida) bir batch ni ikki marta qilmaydi
+        job = await conn.fetchrow(
+            """SELECT last_id, target, finished_at FROM reencrypt_jobs
+               WHERE name = 'cards' FOR UPDATE"""
+        )
+        if job is None or job["target"] != card_cipher.header or job["finished_at"]:
+            return None
+        rows = await conn.fetch(
+            """SELECT id, card_number FROM cards
+               WHERE id > $1 AND substring(card_number FOR 3) <> $2
+               ORDER BY id LIMIT $3""",
+            job["last_id"], card_cipher.header, limit
+        )
+        if not rows:
+            await conn.execute(
+                """UPDATE reencrypt_jobs SET finished_at = NOW(), updated_at = NOW()
+                   WHERE name = 'cards'"""
+            )
+            return None
+        updates = await asyncio.to_thread(_rotate_cards, rows)
+        # Orada o'chirilgan/o'zgargan kartalar tegilmaydi
+        if updates:
+            await conn.execute(
+                """UPDATE cards c SET card_number = u.new, last4 = COALESCE(c.last4, u.last4)
+                   FROM unnest($1::int[], $2::bytea[], $3::bytea[], $4::text[])
+                        AS u(id, new, old, last4)
+                   WHERE c.id = u.id AND c.card_number = u.old""",
+                *map(list, zip(*updates))
+            )
+        await conn.execute(
+            """UPDATE reencrypt_jobs SET last_id = $1, rotated = rotated + $2, updated_at = NOW()
+               WHERE name = 'cards'""",
+            rows[-1]["id"], len(updates)
+        )
+    return len(rows)
@@ -0,0 +1,190 @@
+"""aiogram FSM holatlarini PostgreSQL da saqlash (db.pool orqali).
+
+Bir nechta webhook worker bo'lsa ham va restartdan keyin ham FSM oqimlari
+(AddParticipant, EditFIO, ...) davom etadi. Bitta update ichidagi
+yozishlar xotirada yig'iladi va FSMFlushMiddleware update oxirida bitta
+so'rov bilan yozadi. Tashlab ketilgan oqimlar FSM_TTL dan keyin o'chadi.
+
+data (oqim davomida kiritilgan karta raqamlari ham) bazaga db.card_cipher
+bilan shifrlab yoziladi — ochiq holda faqat xotirada.
+
+Yagona jarayonda holatlar keshda qoladi (har update da SELECT yo'q).
+shared=True (bir nechta jarayon, scheduler user_lock bilan) — update
+oxirida kesh yozuvi chiqariladi, keyingi update bazadan o'qiydi.
+"""
+import asyncio
+import copy
+import json
+import logging
+import os
+import time
+from typing import Any, Mapping
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+import cipher
+import db
+
+FSM_TTL = float(os.environ.get("FSM_TTL", 24 * 3600))
+FSM_FLUSH_INTERVAL = float(os.environ.get("FSM_FLUSH_INTERVAL", 5))
+# Shuncha vaqt ishlatilmagan (yozilgan) kesh yozuvlari xotiradan chiqariladi
+FSM_CACHE_IDLE = float(os.environ.get("FSM_CACHE_IDLE", 600))
+
+
+def _dump(data: dict) -> bytes:
+    return db.card_cipher.encrypt(json.dumps(data, separators=(",", ":")))
+
+
+def _load(raw: bytes | None) -> dict:
+    if not raw:
+        return {}
+    try:
+        return json.loads(db.card_cipher.decrypt(raw))
+    except cipher.DECRYPT_ERRORS as e:
+        # Kalit olib tashlangan — oqim boshidan boshlanadi
+        logging.warning(f"FSM ma'lumotini ochib bo'lmadi: {e!r}")
+        return {}
+
+
+def _key(key: StorageKey) -> str:
+    """Ixcham kalit: default qiymatli qismlar yozilmaydi"""
+    parts = [str(key.bot_id), str(key.chat_id), str(key.user_id)]
+    if key.thread_id:
+        parts.append(f"t{key.thread_id}")
+    if getattr(key, "business_connection_id", None):
+        parts.append(f"b{key.business_connection_id}")
+    if key.destiny != "default":
+        parts.append(key.destiny)
+    return ":".join(parts)
+
+
+class PostgresStorage(BaseStorage):
+    def __init__(self, ttl: float = FSM_TTL, flush_interval: float = FSM_FLUSH_INTERVAL,
+                 shared: bool = False):
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.shared = shared
+        self._cache: dict[str, list] = {}  # key -> [state, data, oxirgi murojaat]
+        self._dirty: set[str] = set()
+        self._writing: dict[str, asyncio.Future] = {}  # key -> bazaga yozilayotgan flush
+        self._task: asyncio.Task | None = None
+
+    async def _entry(self, key: StorageKey) -> list:
+        if self._task is None:
+            self._task = asyncio.create_task(self._background())
+        k = _key(key)
+        entry = self._cache.get(k)
+        if entry is None:
+            row = await db.pool.fetchrow(
+                """SELECT state, data FROM fsm_storage
+                   WHERE key = $1 AND updated_at > NOW() - make_interval(secs => $2)""",
+                k, self.ttl, name="fsm_get"
+            )
+            entry = self._cache.setdefault(k, [
+                row["state"] if row else None,
+                _load(row["data"]) if row else {},
+                0.0,
+            ])
+        entry[2] = time.monotonic()
+        return entry
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        entry = await self._entry(key)
+        entry[0] = state.state if isinstance(state, State) else state
+        self._dirty.add(_key(key))
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        return (await self._entry(key))[0]
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        entry = await self._entry(key)
+        entry[1] = copy.deepcopy(dict(data))
+        self._dirty.add(_key(key))
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        return copy.deepcopy((await self._entry(key))[1])
+
+    async def flush(self, key: StorageKey | None = None):
+        """O'zgarganlarni bazaga yozish (None — hammasi). Yozilmasa — yana
+        dirty bo'lib qoladi. shared da update oxirida (key) kesh yozuvi chiqariladi"""
+        keys = [_key(key)] if key is not None else list(self._dirty)
+        # Shu kalitlarning oldingi yozishi tugasin — eski holat yangisining ustiga tushmasin
+        while busy := [self._writing[k] for k in keys if k in self._writing]:
+            await asyncio.gather(*busy, return_exceptions=True)
+        keys = [k for k in keys if k in self._dirty]
+        if keys:
+            await self._write(keys)
+        if key is not None and self.shared:
+            k = keys[0] if keys else _key(key)
+            if k not in self._dirty:
+                self._cache.pop(k, None)
+
+    async def _write(self, keys: list[str]):
+        upserts, deletes = [], []
+        for k in keys:
+            state, data, _ = self._cache[k]
+            if state is None and not data:
+                deletes.append(k)
+            else:
+                upserts.append((k, state, _dump(data)))
+        self._dirty.difference_update(keys)
+        done = asyncio.get_running_loop().create_future()
+        for k in keys:
+            self._writing[k] = done
+        try:
+            if upserts:
+                await db.pool.executemany(
+                    """INSERT INTO fsm_storage (key, state, data, updated_at)
+                       VALUES ($1, $2, $3, NOW())
+                       ON CONFLICT (key) DO UPDATE
+                       SET state = EXCLUDED.state, data = EXCLUDED.data, updated_at = NOW()""",
+                    upserts, name="fsm_set"
+                )
+            if deletes:
+                await db.pool.execute(
+                    "DELETE FROM fsm_storage WHERE key = ANY($1::text[])", deletes,
+                    name="fsm_delete"
+                )
+        except BaseException:
+            # Keyingi flush qayta urinadi (kesh yozuvi joyida)
+            self._dirty.update(keys)
+            logging.exception(f"FSM holati yozilmadi ({len(keys)} ta kalit)")
+            raise
+        finally:
+            for k in keys:
+                if self._writing.get(k) is done:
+                    del self._writing[k]
+            done.set_result(None)
+
+    def _prune(self):
+        """Uzoq ishlatilmagan, yozib bo'lingan yozuvlarni xotiradan chiqarish"""
+        idle = time.monotonic() - FSM_CACHE_IDLE
+        for k in [k for k, entry in self._cache.items() if entry[2] < idle]:
+            if k not in self._dirty and k not in self._writing:
+                del self._cache[k]
+
+    async def _background(self):
+        """Middleware'siz yozishlarni ham saqlash + eskirgan oqimlarni tozalash"""
+        ticks = 0
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                self._prune()
+                ticks += 1
+                if ticks * self.flush_interval >= 600:
+                    ticks = 0
+                    await db.pool.execute(
+                        "DELETE FROM fsm_storage WHERE updated_at < NOW() - make_interval(secs => $1)",
+                        self.ttl, name="fsm_cleanup"
+                    )
+            except Exception:
+                logging.exception("FSM fon flush/tozalash xatosi")
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if db.pool:
+            await self.flush()
@@ -6,11 +6,12 @@ from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 
 import db
+from reencrypt import progress_text
 from states import BlockUser
 from keyboards import (
     super_admin_menu, sa_org_list, sa_org_detail,
     blocked_users_list, participant_list, org_members_list,
-    participant_detail, card_list_for_delete, format_card,
+    participant_detail, card_list_for_delete, format_card, page_cursor,
 )
 
 router = Router()
@@ -45,13 +46,13 @@ async def cb_sa_back(callback: CallbackQuery, state: FSMContext):
 # Barcha jamoalar
 # ========================
 
-@router.callback_query(F.data == "sa_all_orgs")
+@router.callback_query((F.data == "sa_all_orgs") | F.data.startswith("sa_all_orgs:"))
 async def cb_sa_all_orgs(callback: CallbackQuery, state: FSMContext):
     if not is_super_admin(callback.from_user.id):
         return
     await state.clear()
-    orgs = await db.get_all_orgs()
-    if not orgs:
+    orgs = await db.get_all_orgs(*page_cursor(callback.data, 1))
+    if not orgs.rows:
         await callback.message.edit_text(
             "Jamoalar yo'q.", reply_markup=super_admin_menu()
         )
@@ -85,8 +86,8 @@ async def cb_sa_participants(callback: CallbackQuery):
     if not is_super_admin(callback.from_user.id):
         return
     org_id = int(callback.data.split(":")[1])
-    participants = await db.get_participants(org_id)
-    if not participants:
+    participants = await db.get_participants(org_id, *page_cursor(callback.data, 2))
+    if not participants.rows:
         await callback.message.edit_text(
             "Ishtirokchilar yo'q.",
             reply_markup=sa_org_detail(org_id)
@@ -94,7 +95,7 @@ async def cb_sa_participants(callback: CallbackQuery):
         return
     await callback.message.edit_text(
         "Ishtirokchilar:",
-        reply_markup=participant_list(participants, org_id)
+        reply_markup=participant_list(participants, org_id, f"sa_participants:{org_id}")
     )
 
 
@@ -103,16 +104,16 @@ async def cb_sa_members(callback: CallbackQuery):
     if not is_super_admin(callback.from_user.id):
         return
     org_id = int(callback.data.split(":")[1])
-    members = await db.get_org_members(org_id)
-    if not members:
+    members = await db.get_org_members(org_id, *page_cursor(callback.data, 2))
+    if not members.rows:
         await callback.message.edit_text(
             "A'zolar yo'q.",
             reply_markup=sa_org_detail(org_id)
         )
         return
     await callback.message.edit_text(
-        f"A'zolar ({len(members)} ta):",
-        reply_markup=org_members_list(members, org_id)
+        "A'zolar:",
+        reply_markup=org_members_list(members, org_id, f"sa_members:{org_id}")
     )
 
 
@@ -124,7 +125,7 @@ async def cb_sa_delete_org(callback: CallbackQuery):
     await db.delete_org(org_id)
     await callback.answer("Jamoa o'chirildi!")
     orgs = await db.get_all_orgs()
-    if not orgs:
+    if not orgs.rows:
         await callback.message.edit_text(
             "Jamoalar yo'q.", reply_markup=super_admin_menu()
         )
@@ -138,13 +139,13 @@ async def cb_sa_delete_org(callback: CallbackQuery):
 # Bloklangan userlar
 # ========================
 
-@router.callback_query(F.data == "sa_blocked_users")
+@router.callback_query((F.data == "sa_blocked_users") | F.data.startswith("sa_blocked_users:"))
 async def cb_sa_blocked_users(callback: CallbackQuery, state: FSMContext):
     if not is_super_admin(callback.from_user.id):
         return
     await state.clear()
-    users = await db.get_blocked_users()
-    if not users:
+    users = await db.get_blocked_users(*page_cursor(callback.data, 1))
+    if not users.rows:
         await callback.message.edit_text(
             "Bloklangan userlar yo'q.", reply_markup=super_admin_menu()
         )
@@ -164,7 +165,7 @@ async def cb_sa_unblock(callback: CallbackQuery):
     await callback.answer("User blokdan yechildi!")
 
     users = await db.get_blocked_users()
-    if not users:
+    if not users.rows:
         await callback.message.edit_text(
             "Bloklangan userlar yo'q.", reply_markup=super_admin_menu()
         )
@@ -207,3 +208,17 @@ async def process_block_user(message: Message, state: FSMContext):
         parse_mode="Markdown",
         reply_markup=super_admin_menu()
     )
+
+
+# ========================
+# Kartalarni qayta shifrlash holati
+# ========================
+
+@router.callback_query(F.data == "sa_reencrypt")
+async def cb_sa_reencrypt(callback: CallbackQuery, state: FSMContext):
+    if not is_super_admin(callback.from_user.id):
+        return
+    await state.clear()
+    await callback.message.edit_text(
+        progress_text(await db.get_reencrypt_job()), reply_markup=super_admin_menu()
+    )
@@ -8,52 +8,41 @@ from aiogram.types import (
 )
 
 import db
+import metrics
+from cache import LRUCache
 from keyboards import format_card
 
 router = Router()
 SUPER_ADMIN_ID = int(os.environ.get("SUPER_ADMIN", 0))
+PAGE_SIZE = 50  # Telegram bitta javobda 50 tadan ko'p natija qabul qilmaydi
+# Telegram tomonidagi kesh (is_personal=True — har bir user uchun alohida)
+CACHE_TIME = int(os.environ.get("INLINE_CACHE_TIME", 30))
 
+# (telegram_id, so'rov, offset) -> (versiya, natijalar, next_offset)
+_rendered = LRUCache(
+    max_size=int(os.environ.get("INLINE_CACHE_SIZE", 10_000)),
+    ttl=float(os.environ.get("INLINE_CACHE_TTL", 600)),
+)
+metrics.register_cache("inline", _rendered)
 
-@router.inline_query()
-async def inline_handler(query: InlineQuery):
-    if await db.is_blocked(query.from_user.id):
-        await query.answer(results=[], cache_time=5)
-        return
-
-    is_super = query.from_user.id == SUPER_ADMIN_ID
-
-    # 1 ta so'rov — ishtirokchilar + kartalar birga
-    if is_super:
-        participants = await db.get_all_participants_with_cards()
-    else:
-        participants = await db.get_participants_with_cards_for_user(query.from_user.id)
 
-    if not participants:
-        await query.answer(
-            results=[
-                InlineQueryResultArticle(
-                    id="empty",
-                    title="Ishtirokchilar yo'q",
-                    description="Jamoaga ulanib, ishtirokchi qo'shing",
-                    input_message_content=InputTextMessageContent(
-                        message_text="Hozircha ishtirokchilar yo'q.",
-                    ),
-                )
-            ],
-            cache_time=5,
-        )
-        return
+def render_results(participants, search: str, after_id: int):
+    if not participants and not search and not after_id:
+        return [
+            InlineQueryResultArticle(
+                id="empty",
+                title="Ishtirokchilar yo'q",
+                description="Jamoaga ulanib, ishtirokchi qo'shing",
+                input_message_content=InputTextMessageContent(
+                    message_text="Hozircha ishtirokchilar yo'q.",
+                ),
+            )
+        ]
 
-    search = query.query.strip().lower()
     results = []
 
     for p in participants:
-        if search and search not in p["fio"].lower():
-            continue
-
         cards = p["cards"]
-        if not cards:
-            continue
 
         cards_text = "\n".join(
             f"`{format_card(c)}`" for c in cards
@@ -73,5 +62,33 @@ async def inline_handler(query: InlineQuery):
                 ),
             )
         )
+    return results
+
+
+@router.inline_query()
+async def inline_handler(query: InlineQuery):
+    user_id = query.from_user.id
+    is_super = user_id == SUPER_ADMIN_ID
+    search = " ".join(query.query.split())
+    # offset — oldingi sahifadagi oxirgi ishtirokchi id si (keyset)
+    after_id = int(query.offset) if query.offset.isdigit() else 0
+
+    version = await db.inline_version(user_id, is_super)
+    key = (user_id, search.lower(), after_id)
+    cached = _rendered.get(key, valid=lambda item: item[0] == version)
+    if cached is not None:
+        _, results, next_offset = cached
+    else:
+        if is_super:
+            participants = await db.search_all_participants(search, PAGE_SIZE, after_id)
+        else:
+            participants = await db.search_participants_for_user(
+                user_id, search, PAGE_SIZE, after_id
+            )
+        results = render_results(participants, search, after_id)
+        next_offset = str(participants[-1]["id"]) if len(participants) == PAGE_SIZE else ""
+        _rendered.set(key, (version, results, next_offset))
 
-    await query.answer(results=results[:50], cache_time=5)
+    await query.answer(
+        results=results, cache_time=CACHE_TIME, is_personal=True, next_offset=next_offset
+    )
@@ -8,16 +8,19 @@ from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 
 import db
+import outbox
 from states import CreateOrg, RenameOrg, AddParticipant, EditFIO, AddCardToParticipant
+from middlewares import OrgAccess, OrgAccessMiddleware, org_role
 from keyboards import (
     user_menu, my_orgs_list, my_org_detail,
     participant_list, participant_detail,
-    card_list_for_delete, done_button, format_card,
-    join_request, org_members_list,
+    card_list_for_delete, done_button, format_card, mask_card,
+    join_request, org_members_list, page_cursor,
     BTN_CREATE, BTN_MY_ORGS,
 )
 
 router = Router()
+router.callback_query.middleware(OrgAccessMiddleware())
 SUPER_ADMIN_ID = int(os.environ.get("SUPER_ADMIN", 0))
 
 
@@ -26,8 +29,13 @@ def generate_unique_id(length: int = 16) -> str:
     return "".join(random.choices(chars, k=length))
 
 
-async def check_blocked(user_id: int) -> bool:
-    return await db.is_blocked(user_id)
+async def participant_text(fio: str, participant_id: int) -> str:
+    """Ishtirokchi ekrani — kartalar yashirilgan (decrypt qilinmaydi)"""
+    cards = await db.get_card_summaries(participant_id)
+    if not cards:
+        return f"FIO: {fio}\n\nKartalar yo'q"
+    cards_text = "\n".join(mask_card(c["last4"]) for c in cards)
+    return f"FIO: {fio}\n\nKartalar ({len(cards)} ta):\n{cards_text}"
 
 
 # ========================
@@ -36,18 +44,12 @@ async def check_blocked(user_id: int) -> bool:
 
 @router.message(CommandStart(deep_link=True))
 async def cmd_start_with_link(message: Message, command: CommandObject, state: FSMContext):
-    if await check_blocked(message.from_user.id):
-        await message.answer("Siz bloklangansiz.")
-        return
     await state.clear()
     await process_join(message, command.args)
 
 
 @router.message(CommandStart())
 async def cmd_start(message: Message, state: FSMContext):
-    if await check_blocked(message.from_user.id):
-        await message.answer("Siz bloklangansiz.")
-        return
     await state.clear()
     await message.answer(
         "Assalomu alaykum! Quyidagi amallardan birini tanlang:",
@@ -57,9 +59,6 @@ async def cmd_start(message: Message, state: FSMContext):
 
 @router.callback_query(F.data == "main_menu")
 async def cb_main_menu(callback: CallbackQuery, state: FSMContext):
-    if await check_blocked(callback.from_user.id):
-        await callback.answer("Siz bloklangansiz.", show_alert=True)
-        return
     await state.clear()
     await callback.message.answer(
         "Quyidagi amallardan birini tanlang:",
@@ -73,17 +72,12 @@ async def cb_main_menu(callback: CallbackQuery, state: FSMContext):
 
 @router.message(F.text == BTN_CREATE)
 async def msg_create_org(message: Message, state: FSMContext):
-    if await check_blocked(message.from_user.id):
-        await message.answer("Siz bloklangansiz.")
-        return
     await state.set_state(CreateOrg.name)
     await message.answer("Jamoa nomini kiriting:")
 
 
 @router.message(CreateOrg.name)
 async def process_create_org(message: Message, state: FSMContext):
-    if await check_blocked(message.from_user.id):
-        return
     name = message.text.strip()
     unique_id = generate_unique_id()
     user = message.from_user
@@ -109,12 +103,9 @@ async def process_create_org(message: Message, state: FSMContext):
 
 @router.message(F.text == BTN_MY_ORGS)
 async def msg_my_orgs(message: Message, state: FSMContext):
-    if await check_blocked(message.from_user.id):
-        await message.answer("Siz bloklangansiz.")
-        return
     await state.clear()
     orgs = await db.get_user_orgs(message.from_user.id)
-    if not orgs:
+    if not orgs.rows:
         await message.answer("Sizda jamoalar yo'q.")
         return
     await message.answer(
@@ -123,14 +114,11 @@ async def msg_my_orgs(message: Message, state: FSMContext):
     )
 
 
-@router.callback_query(F.data == "my_orgs")
+@router.callback_query((F.data == "my_orgs") | F.data.startswith("my_orgs:"))
 async def cb_my_orgs(callback: CallbackQuery, state: FSMContext):
-    if await check_blocked(callback.from_user.id):
-        await callback.answer("Siz bloklangansiz.", show_alert=True)
-        return
     await state.clear()
-    orgs = await db.get_user_orgs(callback.from_user.id)
-    if not orgs:
+    orgs = await db.get_user_orgs(callback.from_user.id, *page_cursor(callback.data, 1))
+    if not orgs.rows:
         try:
             await callback.message.edit_text("Sizda jamoalar yo'q.")
         except Exception:
@@ -188,7 +176,8 @@ async def process_join(message: Message, unique_id: str):
     user_name = user.full_name
     username = f" (@{user.username})" if user.username else ""
 
-    await message.bot.send_message(
+    outbox.send_message(
+        message.bot,
         owner_id,
         f"Yangi ulanish so'rovi!\n\n"
         f"Foydalanuvchi: {user_name}{username}\n"
@@ -210,26 +199,20 @@ async def process_join(message: Message, unique_id: str):
 # ========================
 
 @router.callback_query(F.data.startswith("org_view:"))
-async def cb_org_view(callback: CallbackQuery, state: FSMContext):
-    if await check_blocked(callback.from_user.id):
-        await callback.answer("Siz bloklangansiz.", show_alert=True)
-        return
+async def cb_org_view(callback: CallbackQuery, state: FSMContext, access: OrgAccess):
     await state.clear()
     org_id = int(callback.data.split(":")[1])
-    org = await db.get_org(org_id)
+    org = access.org
     if not org:
         await callback.answer("Jamoa topilmadi")
         return
 
-    is_owner = await db.is_org_owner(callback.from_user.id, org_id)
-    is_super = callback.from_user.id == SUPER_ADMIN_ID
-
     text = f"Jamoa: {org['name']}"
 
     await callback.message.edit_text(
         text,
         parse_mode="Markdown",
-        reply_markup=my_org_detail(org_id, is_owner or is_super)
+        reply_markup=my_org_detail(org_id, access.can_manage)
     )
 
 
@@ -238,12 +221,9 @@ async def cb_org_view(callback: CallbackQuery, state: FSMContext):
 # ========================
 
 @router.callback_query(F.data.startswith("rename_org:"))
-async def cb_rename_org(callback: CallbackQuery, state: FSMContext):
-    if await check_blocked(callback.from_user.id):
-        return
+async def cb_rename_org(callback: CallbackQuery, state: FSMContext, access: OrgAccess):
     org_id = int(callback.data.split(":")[1])
-    is_owner = await db.is_org_owner(callback.from_user.id, org_id)
-    if not is_owner and callback.from_user.id != SUPER_ADMIN_ID:
+    if not access.can_manage:
         await callback.answer("Sizda ruxsat yo'q")
         return
     await state.set_state(RenameOrg.name)
@@ -253,18 +233,15 @@ async def cb_rename_org(callback: CallbackQuery, state: FSMContext):
 
 @router.message(RenameOrg.name)
 async def process_rename_org(message: Message, state: FSMContext):
-    if await check_blocked(message.from_user.id):
-        return
     data = await state.get_data()
     org_id = data["org_id"]
     new_name = message.text.strip()
     await db.rename_org(org_id, new_name)
     await state.clear()
-    org = await db.get_org(org_id)
-    is_owner = await db.is_org_owner(message.from_user.id, org_id)
+    org = await db.get_org_access(message.from_user.id, org_id)
     await message.answer(
         f"Jamoa nomi o'zgartirildi!\n\nJamoa: {org['name']}",
-        reply_markup=my_org_detail(org_id, is_owner or message.from_user.id == SUPER_ADMIN_ID)
+        reply_markup=my_org_detail(org_id, org_role(message.from_user.id, org) in ("super", "owner"))
     )
 
 
@@ -273,18 +250,15 @@ async def process_rename_org(message: Message, state: FSMContext):
 # ========================
 
 @router.callback_query(F.data.startswith("delete_org:"))
-async def cb_delete_org(callback: CallbackQuery):
-    if await check_blocked(callback.from_user.id):
-        return
+async def cb_delete_org(callback: CallbackQuery, access: OrgAccess):
     org_id = int(callback.data.split(":")[1])
-    is_owner = await db.is_org_owner(callback.from_user.id, org_id)
-    if not is_owner and callback.from_user.id != SUPER_ADMIN_ID:
+    if not access.can_manage:
         await callback.answer("Sizda ruxsat yo'q")
         return
     await db.delete_org(org_id)
     await callback.answer("Jamoa o'chirildi!")
     orgs = await db.get_user_orgs(callback.from_user.id)
-    if not orgs:
+    if not orgs.rows:
         await callback.message.edit_text("Sizda jamoalar yo'q.")
     else:
         await callback.message.edit_text(
@@ -298,17 +272,15 @@ async def cb_delete_org(callback: CallbackQuery):
 # ========================
 
 @router.callback_query(F.data.startswith("leave_org:"))
-async def cb_leave_org(callback: CallbackQuery):
-    if await check_blocked(callback.from_user.id):
-        return
+async def cb_leave_org(callback: CallbackQuery, access: OrgAccess):
     org_id = int(callback.data.split(":")[1])
-    if await db.is_org_owner(callback.from_user.id, org_id):
+    if access.org and access.org["owner_id"] == callback.from_user.id:
         await callback.answer("Siz egasiz, chiqib keta olmaysiz. Jamoani o'chiring.", show_alert=True)
         return
     await db.remove_user_from_org(callback.from_user.id, org_id)
     await callback.answer("Jamoadan chiqdingiz!")
     orgs = await db.get_user_orgs(callback.from_user.id)
-    if not orgs:
+    if not orgs.rows:
         await callback.message.edit_text("Sizda jamoalar yo'q.")
     else:
         await callback.message.edit_text(
@@ -322,11 +294,9 @@ async def cb_leave_org(callback: CallbackQuery):
 # ========================
 
 @router.callback_query(F.data.startswith("org_link:"))
-async def cb_org_link(callback: CallbackQuery):
-    if await check_blocked(callback.from_user.id):
-        return
+async def cb_org_link(callback: CallbackQuery, access: OrgAccess):
     org_id = int(callback.data.split(":")[1])
-    org = await db.get_org(org_id)
+    org = access.org
     if not org:
         await callback.answer("Jamoa topilmadi")
         return
@@ -345,12 +315,9 @@ async def cb_org_link(callback: CallbackQuery):
 # ========================
 
 @router.callback_query(F.data.startswith("add_participant:"))
-async def cb_add_participant(callback: CallbackQuery, state: FSMContext):
-    if await check_blocked(callback.from_user.id):
-        return
+async def cb_add_participant(callback: CallbackQuery, state: FSMContext, access: OrgAccess):
     org_id = int(callback.data.split(":")[1])
-    is_owner = await db.is_org_owner(callback.from_user.id, org_id)
-    if not is_owner and callback.from_user.id != SUPER_ADMIN_ID:
+    if not access.can_manage:
         await callback.answer("Sizda ruxsat yo'q")
         return
     await state.set_state(AddParticipant.fio)
@@ -360,8 +327,6 @@ async def cb_add_participant(callback: CallbackQuery, state: FSMContext):
 
 @router.message(AddParticipant.fio)
 async def process_participant_fio(message: Message, state: FSMContext):
-    if await check_blocked(message.from_user.id):
-        return
     fio = message.text.strip()
     await state.update_data(fio=fio)
     await state.set_state(AddParticipant.cards)
@@ -375,8 +340,6 @@ async def process_participant_fio(message: Message, state: FSMContext):
 
 @router.message(AddParticipant.cards)
 async def process_participant_card(message: Message, state: FSMContext):
-    if await check_blocked(message.from_user.id):
-        return
     card = message.text.strip().replace(" ", "")
     if not card.isdigit() or len(card) != 16:
         await message.answer("Xato! Karta raqami 16 xonali bo'lishi kerak. Qayta kiriting:")
@@ -398,8 +361,6 @@ async def process_participant_card(message: Message, state: FSMContext):
 
 @router.callback_query(F.data == "done", AddParticipant.cards)
 async def cb_done_participant(callback: CallbackQuery, state: FSMContext):
-    if await check_blocked(callback.from_user.id):
-        return
     data = await state.get_data()
     org_id = data["org_id"]
     fio = data["fio"]
@@ -409,15 +370,13 @@ async def cb_done_participant(callback: CallbackQuery, state: FSMContext):
         await callback.answer("Kamida bitta karta kiriting!")
         return
 
-    participant_id = await db.create_participant(org_id, fio)
-    for card in cards:
-        await db.add_card(participant_id, card)
+    await db.create_participant_with_cards(org_id, fio, cards)
 
     await state.clear()
-    is_owner = await db.is_org_owner(callback.from_user.id, org_id)
+    org = await db.get_org_access(callback.from_user.id, org_id)
     await callback.message.edit_text(
         f"Ishtirokchi qo'shildi!\n\nFIO: {fio}\nKartalar: {len(cards)} ta",
-        reply_markup=my_org_detail(org_id, is_owner or callback.from_user.id == SUPER_ADMIN_ID)
+        reply_markup=my_org_detail(org_id, org_role(callback.from_user.id, org) in ("super", "owner"))
     )
 
 
@@ -426,16 +385,13 @@ async def cb_done_participant(callback: CallbackQuery, state: FSMContext):
 # ========================
 
 @router.callback_query(F.data.startswith("list_participants:"))
-async def cb_list_participants(callback: CallbackQuery):
-    if await check_blocked(callback.from_user.id):
-        return
+async def cb_list_participants(callback: CallbackQuery, access: OrgAccess):
     org_id = int(callback.data.split(":")[1])
-    participants = await db.get_participants(org_id)
-    if not participants:
-        is_owner = await db.is_org_owner(callback.from_user.id, org_id)
+    participants = await db.get_participants(org_id, *page_cursor(callback.data, 2))
+    if not participants.rows:
         await callback.message.edit_text(
             "Ishtirokchilar yo'q.",
-            reply_markup=my_org_detail(org_id, is_owner or callback.from_user.id == SUPER_ADMIN_ID)
+            reply_markup=my_org_detail(org_id, access.can_manage)
         )
         return
     await callback.message.edit_text(
@@ -449,23 +405,34 @@ async def cb_list_participants(callback: CallbackQuery):
 # ========================
 
 @router.callback_query(F.data.startswith("participant:"))
-async def cb_participant_detail(callback: CallbackQuery, state: FSMContext):
-    if await check_blocked(callback.from_user.id):
-        return
+async def cb_participant_detail(callback: CallbackQuery, state: FSMContext, access: OrgAccess):
     await state.clear()
     participant_id = int(callback.data.split(":")[1])
-    p = await db.get_participant(participant_id)
+    p = access.participant
+    if not p:
+        await callback.answer("Ishtirokchi topilmadi")
+        return
+    await callback.message.edit_text(
+        await participant_text(p["fio"], participant_id),
+        parse_mode="Markdown",
+        reply_markup=participant_detail(participant_id, p["org_id"], access.can_manage)
+    )
+
+
+@router.callback_query(F.data.startswith("show_cards:"))
+async def cb_show_cards(callback: CallbackQuery, access: OrgAccess):
+    """To'liq raqamlar — faqat shu yerda decrypt qilinadi"""
+    participant_id = int(callback.data.split(":")[1])
+    p = access.participant
     if not p:
         await callback.answer("Ishtirokchi topilmadi")
         return
     cards = await db.get_cards(participant_id)
     cards_text = "\n".join(f"`{format_card(c['card_number'])}`" for c in cards) if cards else "Kartalar yo'q"
-    is_owner = await db.is_org_owner(callback.from_user.id, p["org_id"])
     await callback.message.edit_text(
         f"FIO: {p['fio']}\n\nKartalar:\n{cards_text}",
         parse_mode="Markdown",
-        reply_markup=participant_detail(participant_id, p["org_id"],
-                                       is_owner or callback.from_user.id == SUPER_ADMIN_ID)
+        reply_markup=participant_detail(participant_id, p["org_id"], access.can_manage)
     )
 
 
@@ -474,16 +441,13 @@ async def cb_participant_detail(callback: CallbackQuery, state: FSMContext):
 # ========================
 
 @router.callback_query(F.data.startswith("edit_fio:"))
-async def cb_edit_fio(callback: CallbackQuery, state: FSMContext):
-    if await check_blocked(callback.from_user.id):
-        return
+async def cb_edit_fio(callback: CallbackQuery, state: FSMContext, access: OrgAccess):
     participant_id = int(callback.data.split(":")[1])
-    p = await db.get_participant(participant_id)
+    p = access.participant
     if not p:
         await callback.answer("Ishtirokchi topilmadi")
         return
-    is_owner = await db.is_org_owner(callback.from_user.id, p["org_id"])
-    if not is_owner and callback.from_user.id != SUPER_ADMIN_ID:
+    if not access.can_manage:
         await callback.answer("Sizda ruxsat yo'q")
         return
     await state.set_state(EditFIO.fio)
@@ -493,23 +457,18 @@ async def cb_edit_fio(callback: CallbackQuery, state: FSMContext):
 
 @router.message(EditFIO.fio)
 async def process_edit_fio(message: Message, state: FSMContext):
-    if await check_blocked(message.from_user.id):
-        return
     data = await state.get_data()
     participant_id = data["participant_id"]
     new_fio = message.text.strip()
     await db.rename_participant(participant_id, new_fio)
     await state.clear()
 
-    p = await db.get_participant(participant_id)
-    cards = await db.get_cards(participant_id)
-    cards_text = "\n".join(f"`{format_card(c['card_number'])}`" for c in cards) if cards else "Kartalar yo'q"
-    is_owner = await db.is_org_owner(message.from_user.id, p["org_id"])
+    p, org = await db.get_participant_access(message.from_user.id, participant_id)
     await message.answer(
-        f"FIO o'zgartirildi!\n\nFIO: {p['fio']}\n\nKartalar:\n{cards_text}",
+        "FIO o'zgartirildi!\n\n" + await participant_text(p["fio"], participant_id),
         parse_mode="Markdown",
         reply_markup=participant_detail(participant_id, p["org_id"],
-                                       is_owner or message.from_user.id == SUPER_ADMIN_ID)
+                                       org_role(message.from_user.id, org) in ("super", "owner"))
     )
 
 
@@ -518,16 +477,13 @@ async def process_edit_fio(message: Message, state: FSMContext):
 # ========================
 
 @router.callback_query(F.data.startswith("add_card:"))
-async def cb_add_card(callback: CallbackQuery, state: FSMContext):
-    if await check_blocked(callback.from_user.id):
-        return
+async def cb_add_card(callback: CallbackQuery, state: FSMContext, access: OrgAccess):
     participant_id = int(callback.data.split(":")[1])
-    p = await db.get_participant(participant_id)
+    p = access.participant
     if not p:
         await callback.answer("Ishtirokchi topilmadi")
         return
-    is_owner = await db.is_org_owner(callback.from_user.id, p["org_id"])
-    if not is_owner and callback.from_user.id != SUPER_ADMIN_ID:
+    if not access.can_manage:
         await callback.answer("Sizda ruxsat yo'q")
         return
     await state.set_state(AddCardToParticipant.cards)
@@ -540,8 +496,6 @@ async def cb_add_card(callback: CallbackQuery, state: FSMContext):
 
 @router.message(AddCardToParticipant.cards)
 async def process_add_card(message: Message, state: FSMContext):
-    if await check_blocked(message.from_user.id):
-        return
     card = message.text.strip().replace(" ", "")
     if not card.isdigit() or len(card) != 16:
         await message.answer("Xato! Karta raqami 16 xonali bo'lishi kerak. Qayta kiriting:")
@@ -569,8 +523,6 @@ async def process_add_card(message: Message, state: FSMContext):
 
 @router.callback_query(F.data == "done", AddCardToParticipant.cards)
 async def cb_done_add_card(callback: CallbackQuery, state: FSMContext):
-    if await check_blocked(callback.from_user.id):
-        return
     data = await state.get_data()
     participant_id = data["participant_id"]
     cards = data.get("cards", [])
@@ -579,19 +531,15 @@ async def cb_done_add_card(callback: CallbackQuery, state: FSMContext):
         await callback.answer("Kamida bitta karta kiriting!")
         return
 
-    for card in cards:
-        await db.add_card(participant_id, card)
+    await db.add_cards(participant_id, cards)
 
     await state.clear()
-    p = await db.get_participant(participant_id)
-    all_cards = await db.get_cards(participant_id)
-    cards_text = "\n".join(f"`{format_card(c['card_number'])}`" for c in all_cards)
-    is_owner = await db.is_org_owner(callback.from_user.id, p["org_id"])
+    p, org = await db.get_participant_access(callback.from_user.id, participant_id)
     await callback.message.edit_text(
-        f"Kartalar qo'shildi!\n\nFIO: {p['fio']}\n\nKartalar:\n{cards_text}",
+        "Kartalar qo'shildi!\n\n" + await participant_text(p["fio"], participant_id),
         parse_mode="Markdown",
         reply_markup=participant_detail(participant_id, p["org_id"],
-                                       is_owner or callback.from_user.id == SUPER_ADMIN_ID)
+                                       org_role(callback.from_user.id, org) in ("super", "owner"))
     )
 
 
@@ -600,19 +548,16 @@ async def cb_done_add_card(callback: CallbackQuery, state: FSMContext):
 # ========================
 
 @router.callback_query(F.data.startswith("del_card:"))
-async def cb_del_card_list(callback: CallbackQuery):
-    if await check_blocked(callback.from_user.id):
-        return
+async def cb_del_card_list(callback: CallbackQuery, access: OrgAccess):
     participant_id = int(callback.data.split(":")[1])
-    p = await db.get_participant(participant_id)
+    p = access.participant
     if not p:
         await callback.answer("Ishtirokchi topilmadi")
         return
-    is_owner = await db.is_org_owner(callback.from_user.id, p["org_id"])
-    if not is_owner and callback.from_user.id != SUPER_ADMIN_ID:
+    if not access.can_manage:
         await callback.answer("Sizda ruxsat yo'q")
         return
-    cards = await db.get_cards(participant_id)
+    cards = await db.get_card_summaries(participant_id)
     if not cards:
         await callback.answer("Kartalar yo'q!")
         return
@@ -623,30 +568,24 @@ async def cb_del_card_list(callback: CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("remove_card:"))
-async def cb_remove_card(callback: CallbackQuery):
-    if await check_blocked(callback.from_user.id):
-        return
+async def cb_remove_card(callback: CallbackQuery, access: OrgAccess):
     parts = callback.data.split(":")
     card_id = int(parts[1])
     participant_id = int(parts[2])
-    p = await db.get_participant(participant_id)
+    p = access.participant
     if not p:
         await callback.answer("Ishtirokchi topilmadi")
         return
-    is_owner = await db.is_org_owner(callback.from_user.id, p["org_id"])
-    if not is_owner and callback.from_user.id != SUPER_ADMIN_ID:
+    if not access.can_manage:
         await callback.answer("Sizda ruxsat yo'q")
         return
     await db.delete_card(card_id)
     await callback.answer("Karta o'chirildi!")
 
-    cards = await db.get_cards(participant_id)
-    cards_text = "\n".join(f"`{format_card(c['card_number'])}`" for c in cards) if cards else "Kartalar yo'q"
     await callback.message.edit_text(
-        f"FIO: {p['fio']}\n\nKartalar:\n{cards_text}",
+        await participant_text(p["fio"], participant_id),
         parse_mode="Markdown",
-        reply_markup=participant_detail(participant_id, p["org_id"],
-                                       is_owner or callback.from_user.id == SUPER_ADMIN_ID)
+        reply_markup=participant_detail(participant_id, p["org_id"], access.can_manage)
     )
 
 
@@ -655,24 +594,21 @@ async def cb_remove_card(callback: CallbackQuery):
 # ========================
 
 @router.callback_query(F.data.startswith("del_participant:"))
-async def cb_del_participant(callback: CallbackQuery):
-    if await check_blocked(callback.from_user.id):
-        return
+async def cb_del_participant(callback: CallbackQuery, access: OrgAccess):
     participant_id = int(callback.data.split(":")[1])
-    p = await db.get_participant(participant_id)
+    p = access.participant
     if not p:
         await callback.answer("Ishtirokchi topilmadi")
         return
     org_id = p["org_id"]
-    is_owner = await db.is_org_owner(callback.from_user.id, org_id)
-    if not is_owner and callback.from_user.id != SUPER_ADMIN_ID:
+    if not access.can_manage:
         await callback.answer("Sizda ruxsat yo'q")
         return
     await db.delete_participant(participant_id)
     await callback.answer("Ishtirokchi o'chirildi!")
 
     participants = await db.get_participants(org_id)
-    if not participants:
+    if not participants.rows:
         await callback.message.edit_text(
             "Ishtirokchilar yo'q.",
             reply_markup=my_org_detail(org_id, True)
@@ -689,53 +625,47 @@ async def cb_del_participant(callback: CallbackQuery):
 # ========================
 
 @router.callback_query(F.data.startswith("list_members:"))
-async def cb_list_members(callback: CallbackQuery):
-    if await check_blocked(callback.from_user.id):
-        return
+async def cb_list_members(callback: CallbackQuery, access: OrgAccess):
     org_id = int(callback.data.split(":")[1])
-    is_owner = await db.is_org_owner(callback.from_user.id, org_id)
-    if not is_owner and callback.from_user.id != SUPER_ADMIN_ID:
+    if not access.can_manage:
         await callback.answer("Sizda ruxsat yo'q")
         return
-    members = await db.get_org_members(org_id)
-    if not members:
+    members = await db.get_org_members(org_id, *page_cursor(callback.data, 2))
+    if not members.rows:
         await callback.message.edit_text(
             "A'zolar yo'q.",
             reply_markup=my_org_detail(org_id, True)
         )
         return
     await callback.message.edit_text(
-        f"A'zolar ({len(members)} ta):\nO'chirish uchun ❌ tugmasini bosing.",
+        "A'zolar:\nO'chirish uchun ❌ tugmasini bosing.",
         reply_markup=org_members_list(members, org_id)
     )
 
 
 @router.callback_query(F.data.startswith("remove_member:"))
-async def cb_remove_member(callback: CallbackQuery):
-    if await check_blocked(callback.from_user.id):
-        return
+async def cb_remove_member(callback: CallbackQuery, access: OrgAccess):
     parts = callback.data.split(":")
     telegram_id = int(parts[1])
     org_id = int(parts[2])
-    is_owner = await db.is_org_owner(callback.from_user.id, org_id)
-    if not is_owner and callback.from_user.id != SUPER_ADMIN_ID:
+    if not access.can_manage:
         await callback.answer("Sizda ruxsat yo'q")
         return
-    if await db.is_org_owner(telegram_id, org_id):
+    if access.org and access.org["owner_id"] == telegram_id:
         await callback.answer("Jamoa egasini o'chirib bo'lmaydi!", show_alert=True)
         return
     await db.remove_user_from_org(telegram_id, org_id)
     await callback.answer("A'zo o'chirildi!")
 
     members = await db.get_org_members(org_id)
-    if not members:
+    if not members.rows:
         await callback.message.edit_text(
             "A'zolar yo'q.",
             reply_markup=my_org_detail(org_id, True)
         )
     else:
         await callback.message.edit_text(
-            f"A'zolar ({len(members)} ta):\nO'chirish uchun ❌ tugmasini bosing.",
+            "A'zolar:\nO'chirish uchun ❌ tugmasini bosing.",
             reply_markup=org_members_list(members, org_id)
         )
 
@@ -745,18 +675,17 @@ async def cb_remove_member(callback: CallbackQuery):
 # ========================
 
 @router.callback_query(F.data.startswith("approve:"))
-async def cb_approve_join(callback: CallbackQuery):
+async def cb_approve_join(callback: CallbackQuery, access: OrgAccess):
     parts = callback.data.split(":")
     telegram_id = int(parts[1])
     org_id = int(parts[2])
 
-    org = await db.get_org(org_id)
+    org = access.org
     if not org:
         await callback.message.edit_text("Jamoa topilmadi.")
         return
 
-    is_owner = await db.is_org_owner(callback.from_user.id, org_id)
-    if not is_owner and callback.from_user.id != SUPER_ADMIN_ID:
+    if not access.can_manage:
         await callback.answer("Sizda ruxsat yo'q")
         return
 
@@ -776,7 +705,8 @@ async def cb_approve_join(callback: CallbackQuery):
         reply_markup=my_org_detail(org_id, True)
     )
 
-    await callback.bot.send_message(
+    outbox.send_message(
+        callback.bot,
         telegram_id,
         f"Sizning so'rovingiz tasdiqlandi!\n"
         f"Siz «{org['name']}» jamoasiga ulandingiz.",
@@ -785,14 +715,13 @@ async def cb_approve_join(callback: CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("deny:"))
-async def cb_deny_join(callback: CallbackQuery):
+async def cb_deny_join(callback: CallbackQuery, access: OrgAccess):
     parts = callback.data.split(":")
     telegram_id = int(parts[1])
     org_id = int(parts[2])
 
-    org = await db.get_org(org_id)
-    is_owner = org and await db.is_org_owner(callback.from_user.id, org_id)
-    if not is_owner and callback.from_user.id != SUPER_ADMIN_ID:
+    org = access.org
+    if not access.can_manage:
         await callback.answer("Sizda ruxsat yo'q")
         return
 
@@ -804,7 +733,8 @@ async def cb_deny_join(callback: CallbackQuery):
         reply_markup=my_org_detail(org_id, True) if org else None
     )
 
-    await callback.bot.send_message(
+    outbox.send_message(
+        callback.bot,
         telegram_id,
         f"Sizning «{org_name}» jamoasiga ulanish so'rovingiz rad etildi.",
         reply_markup=user_menu()
@@ -8,6 +8,31 @@ def format_card(card_number: str) -> str:
     return f"{card_number[:4]} {card_number[4:8]} {card_number[8:12]} {card_number[12:]}"
 
 
+def mask_card(last4: str) -> str:
+    return f"•••• •••• •••• {last4}"
+
+
+def page_cursor(callback_data: str, skip: int) -> tuple[int, int]:
+    """callback_data ning `skip` qismidan keyingi ":n:<id>" / ":p:<id>" dan (after, before)"""
+    parts = callback_data.split(":")[skip:]
+    if len(parts) == 2 and parts[1].isdigit():
+        if parts[0] == "n":
+            return int(parts[1]), 0
+        if parts[0] == "p":
+            return 0, int(parts[1])
+    return 0, 0
+
+
+def _nav_row(prefix: str, page, key: str = "id"):
+    """◀️ / ▶️ tugmalari — sahifaning birinchi/oxirgi kaliti callback_data da"""
+    row = []
+    if page.has_prev and page.rows:
+        row.append(InlineKeyboardButton(text="◀️", callback_data=f"{prefix}:p:{page.rows[0][key]}"))
+    if page.has_next and page.rows:
+        row.append(InlineKeyboardButton(text="▶️", callback_data=f"{prefix}:n:{page.rows[-1][key]}"))
+    return [row] if row else []
+
+
 # --- Doimiy menyu (ReplyKeyboard) ---
 
 BTN_CREATE = "➕ Jamoa yaratish"
@@ -23,11 +48,12 @@ def user_menu():
     )
 
 
-def my_orgs_list(orgs):
+def my_orgs_list(page):
     buttons = [
         [InlineKeyboardButton(text=f"📁 {org['name']}", callback_data=f"org_view:{org['id']}")]
-        for org in orgs
+        for org in page.rows
     ]
+    buttons += _nav_row("my_orgs", page)
     buttons.append([InlineKeyboardButton(text="⬅️ Orqaga", callback_data="main_menu")])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
@@ -62,25 +88,29 @@ def owner_org_detail(org_id: int):
     ])
 
 
-def org_members_list(members, org_id: int):
+def org_members_list(page, org_id: int, nav: str | None = None):
     buttons = []
-    for m in members:
+    for m in page.rows:
         name = m["full_name"] or str(m["telegram_id"])
         buttons.append([
             InlineKeyboardButton(text=f"👤 {name}", callback_data="noop"),
             InlineKeyboardButton(text="❌", callback_data=f"remove_member:{m['telegram_id']}:{org_id}"),
         ])
+    buttons += _nav_row(nav or f"list_members:{org_id}", page, "telegram_id")
     buttons.append([InlineKeyboardButton(text="⬅️ Orqaga", callback_data=f"org_view:{org_id}")])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
 # --- Ishtirokchilar ---
 
-def participant_list(participants, org_id: int):
+def participant_list(page, org_id: int, nav: str | None = None):
     buttons = [
-        [InlineKeyboardButton(text=f"👤 {p['fio']}", callback_data=f"participant:{p['id']}")]
-        for p in participants
+        [InlineKeyboardButton(
+            text=f"👤 {p['fio']} · 💳 {p['card_count']}", callback_data=f"participant:{p['id']}"
+        )]
+        for p in page.rows
     ]
+    buttons += _nav_row(nav or f"list_participants:{org_id}", page)
     buttons.append([InlineKeyboardButton(text="⬅️ Orqaga", callback_data=f"org_view:{org_id}")])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
@@ -96,9 +126,11 @@ def participant_detail(participant_id: int, org_id: int, is_owner: bool = True):
                 InlineKeyboardButton(text="🗑 Karta", callback_data=f"del_card:{participant_id}"),
                 InlineKeyboardButton(text="🗑 O'chirish", callback_data=f"del_participant:{participant_id}"),
             ],
+            [InlineKeyboardButton(text="👁 Raqamlarni ko'rsatish", callback_data=f"show_cards:{participant_id}")],
             [InlineKeyboardButton(text="⬅️ Orqaga", callback_data=f"list_participants:{org_id}")],
         ])
     return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="👁 Raqamlarni ko'rsatish", callback_data=f"show_cards:{participant_id}")],
         [InlineKeyboardButton(text="⬅️ Orqaga", callback_data=f"list_participants:{org_id}")],
     ])
 
@@ -106,7 +138,7 @@ def participant_detail(participant_id: int, org_id: int, is_owner: bool = True):
 def card_list_for_delete(cards, participant_id: int):
     buttons = [
         [InlineKeyboardButton(
-            text=f"💳 {format_card(c['card_number'])}",
+            text=f"💳 {mask_card(c['last4'])}",
             callback_data=f"remove_card:{c['id']}:{participant_id}"
         )]
         for c in cards
@@ -138,15 +170,19 @@ def super_admin_menu():
             InlineKeyboardButton(text="📋 Jamoalar", callback_data="sa_all_orgs"),
             InlineKeyboardButton(text="🚫 Bloklangan", callback_data="sa_blocked_users"),
         ],
-        [InlineKeyboardButton(text="🔒 User bloklash", callback_data="sa_block_user")],
+        [
+            InlineKeyboardButton(text="🔒 User bloklash", callback_data="sa_block_user"),
+            InlineKeyboardButton(text="🔐 Shifrlash", callback_data="sa_reencrypt"),
+        ],
     ])
 
 
-def sa_org_list(orgs):
+def sa_org_list(page):
     buttons = [
         [InlineKeyboardButton(text=f"📁 {org['name']}", callback_data=f"sa_org:{org['id']}")]
-        for org in orgs
+        for org in page.rows
     ]
+    buttons += _nav_row("sa_all_orgs", page)
     buttons.append([InlineKeyboardButton(text="⬅️ Orqaga", callback_data="sa_back")])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
@@ -162,13 +198,14 @@ def sa_org_detail(org_id: int):
     ])
 
 
-def blocked_users_list(users):
+def blocked_users_list(page):
     buttons = [
         [InlineKeyboardButton(
             text=f"🚫 {u['telegram_id']}",
             callback_data=f"sa_unblock:{u['telegram_id']}"
         )]
-        for u in users
+        for u in page.rows
     ]
+    buttons += _nav_row("sa_blocked_users", page, "telegram_id")
     buttons.append([InlineKeyboardButton(text="⬅️ Orqaga", callback_data="sa_back")])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
@@ -0,0 +1,179 @@
+"""Prometheus metrikalari (text format 0.0.4) — tashqi kutubxonasiz.
+
+Webhook rejimida /metrics bot.py dagi aiohttp ilovasida, polling rejimida
+alohida lokal listener (METRICS_PORT, berilsa) orqali beriladi.
+
+Fleet da (WEB_CONCURRENCY > 1) har bir worker o'z hisoblagichlariga ega:
+barcha qatorlarga worker="N" label qo'shiladi va har worker o'z lokal
+portida (METRICS_PORT + N) beradi — Prometheus har birini alohida yig'adi.
+Umumiy portdagi /metrics qaysi worker qabul qilsa, o'shaniki.
+"""
+import bisect
+import logging
+
+from aiohttp import web
+
+# Sekundlarda: tez handlerlar (ms) dan sekin tashqi so'rovlargacha
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_metrics: list = []
+_gauges: list = []  # (nom, help, fn) — qiymat /metrics so'ralganda hisoblanadi
+_caches: dict = {}  # nom -> LRUCache
+_worker_label = ""  # fleet da: worker="N" (set_worker)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def set_worker(worker: int):
+    """Fleet worker: barcha metrikalarga worker label"""
+    global _worker_label
+    _worker_label = f'worker="{worker}"'
+
+
+def _labels(names=(), values=(), extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if _worker_label:
+        pairs.append(_worker_label)
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+        _metrics.append(self)
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in self._values.items():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {value}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: tuple = (),
+                 buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels -> [har bir bucket soni (kumulyativ emas), count, sum]
+        self._values: dict[tuple, list] = {}
+        _metrics.append(self)
+
+    def observe(self, value: float, *labels):
+        item = self._values.get(labels)
+        if item is None:
+            item = self._values[labels] = [[0] * len(self.buckets), 0, 0.0]
+        i = bisect.bisect_left(self.buckets, value)
+        if i < len(self.buckets):
+            item[0][i] += 1
+        item[1] += 1
+        item[2] += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, (counts, count, total) in self._values.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = _labels(self.labelnames, labels, f'le="{bound}"')
+                yield f"{self.name}_bucket{le} {cumulative}"
+            le = _labels(self.labelnames, labels, 'le="+Inf"')
+            yield f"{self.name}_bucket{le} {count}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {count}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {total}"
+
+
+def register_gauge(name: str, help: str, fn):
+    """fn() — /metrics so'ralganda chaqiriladi (masalan pool.get_size)"""
+    _gauges.append((name, help, fn))
+
+
+def register_cache(name: str, cache):
+    """LRUCache.stats() ni cache_* metrikalari sifatida chiqarish"""
+    _caches[name] = cache
+
+
+def _render_caches():
+    stats = {name: cache.stats() for name, cache in _caches.items()}
+    for key, kind, help in (
+        ("hits", "counter", "Kesh topgan so'rovlar"),
+        ("misses", "counter", "Keshda topilmagan so'rovlar"),
+        ("hit_ratio", "gauge", "hits / (hits + misses)"),
+        ("size", "gauge", "Keshdagi yozuvlar soni"),
+    ):
+        name = f"cache_{key}_total" if kind == "counter" else f"cache_{key}"
+        yield f"# HELP {name} {help}"
+        yield f"# TYPE {name} {kind}"
+        for cache, s in stats.items():
+            yield f'{name}{_labels(("cache",), (cache,))} {s[key]}'
+
+
+def render() -> str:
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for name, help, fn in _gauges:
+        try:
+            value = fn()
+        except Exception:
+            logging.exception(f"Gauge {name} hisoblanmadi")
+            continue
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name}{_labels()} {value}"]
+    lines.extend(_render_caches())
+    return "\n".join(lines) + "\n"
+
+
+async def handle(request):
+    return web.Response(
+        body=render().encode(),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+    )
+
+
+async def start_server(host: str, port: int) -> web.AppRunner:
+    """Polling rejimi va fleet workerlari uchun: faqat /metrics beradigan kichik HTTP server"""
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logging.info(f"Metrics: http://{host}:{port}/metrics")
+    return runner
+
+
+# --- Bot metrikalari ---
+
+updates_total = Counter(
+    "bot_updates_total", "Kelgan update'lar soni (turi bo'yicha)", ("update_type",)
+)
+update_seconds = Histogram(
+    "bot_update_duration_seconds", "Update'ni qayta ishlash vaqti (handler bo'yicha)",
+    ("update_type", "handler"),
+)
+errors_total = Counter(
+    "bot_handler_errors_total", "Handlerda ko'tarilgan xatolar", ("handler", "error")
+)
+db_query_seconds = Histogram(
+    "db_query_duration_seconds", "SQL so'rov vaqti (so'rov nomi bo'yicha)",
+    ("statement",),
+)
+update_db_queries = Histogram(
+    "bot_update_db_queries", "Bitta update davomidagi SQL so'rovlar soni",
+    ("handler",), buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+db_acquire_seconds = Histogram(
+    "db_pool_acquire_seconds", "Pooldan ulanish olishni kutish vaqti",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
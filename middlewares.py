@@ -0,0 +1,156 @@
+import os
+import time
+from typing import Any, Awaitable, Callable, NamedTuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, TelegramObject, Update
+
+import db
+import metrics
+
+SUPER_ADMIN_ID = int(os.environ.get("SUPER_ADMIN", 0))
+
+# callback_data prefiksi -> id joylashgan qism indeksi
+ORG_CALLBACKS = {
+    "org_view": 1, "rename_org": 1, "delete_org": 1, "leave_org": 1,
+    "org_link": 1, "add_participant": 1, "list_participants": 1,
+    "list_members": 1, "remove_member": 2, "approve": 2, "deny": 2,
+}
+PARTICIPANT_CALLBACKS = {
+    "participant": 1, "edit_fio": 1, "add_card": 1, "del_card": 1,
+    "del_participant": 1, "remove_card": 2, "show_cards": 1,
+}
+
+
+class BlockedUserMiddleware(BaseMiddleware):
+    """Bloklangan userlarning barcha update'larini to'xtatadi (bazaga so'rovsiz)"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None or not db.is_blocked(user.id):
+            return await handler(event, data)
+
+        if event.message:
+            if not data.get("raw_state"):
+                await event.message.answer("Siz bloklangansiz.")
+        elif event.callback_query:
+            await event.callback_query.answer("Siz bloklangansiz.", show_alert=True)
+        elif event.inline_query:
+            await event.inline_query.answer(results=[], cache_time=5)
+        return None
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Update turi bo'yicha soni, handler bo'yicha vaqt va xatolar (eng tashqi qatlam)"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: dict[str, Any],
+    ) -> Any:
+        update_type = event.event_type
+        metrics.updates_total.inc(update_type)
+        # HandlerNameMiddleware to'ldiradi; hech bir handler mos kelmasa — "unhandled"
+        labels = data["metrics_labels"] = {"handler": "unhandled"}
+        # reset qilinmaydi: aiogram ning "Update ... is handled" logi ham shu
+        # qiymatlarni ko'rsin (har bir update o'z task/kontekstida ishlaydi)
+        stats = db.QueryStats()
+        db.query_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            metrics.errors_total.inc(labels["handler"], type(e).__name__)
+            raise
+        finally:
+            metrics.update_seconds.observe(
+                time.perf_counter() - start, update_type, labels["handler"]
+            )
+            metrics.update_db_queries.observe(stats.queries, labels["handler"])
+
+
+class HandlerNameMiddleware(BaseMiddleware):
+    """Inner middleware: tanlangan handler nomini MetricsMiddleware ga beradi"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        labels = data.get("metrics_labels")
+        if labels is not None:
+            labels["handler"] = data["handler"].callback.__name__
+        return await handler(event, data)
+
+
+class FSMFlushMiddleware(BaseMiddleware):
+    """Update oxirida FSM yozishlarini bitta so'rov bilan bazaga yozadi"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: dict[str, Any],
+    ) -> Any:
+        try:
+            return await handler(event, data)
+        finally:
+            state = data.get("state")
+            if state is not None:
+                await state.storage.flush(state.key)
+
+
+def org_role(user_id: int, org: dict | None) -> str | None:
+    """db.get_org_access / get_participant_access natijasidan rol"""
+    if user_id == SUPER_ADMIN_ID:
+        return "super"
+    if org is None:
+        return None
+    if org["owner_id"] == user_id:
+        return "owner"
+    if org["is_member"]:
+        return "member"
+    return None
+
+
+class OrgAccess(NamedTuple):
+    org: dict | None
+    participant: dict | None
+    role: str | None  # "super" | "owner" | "member" | None
+
+    @property
+    def can_manage(self) -> bool:
+        return self.role in ("super", "owner")
+
+
+class OrgAccessMiddleware(BaseMiddleware):
+    """Callback dagi org/participant id bo'yicha (org, participant, rol) ni
+    bitta so'rov bilan aniqlab, handlerga `access` argumenti qilib beradi"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: CallbackQuery,
+        data: dict[str, Any],
+    ) -> Any:
+        parts = (event.data or "").split(":")
+        user_id = event.from_user.id
+        org = participant = None
+        if parts[0] in ORG_CALLBACKS:
+            org = await db.get_org_access(user_id, int(parts[ORG_CALLBACKS[parts[0]]]))
+        elif parts[0] in PARTICIPANT_CALLBACKS:
+            participant, org = await db.get_participant_access(
+                user_id, int(parts[PARTICIPANT_CALLBACKS[parts[0]]])
+            )
+        else:
+            return await handler(event, data)
+
+        data["access"] = OrgAccess(org, participant, org_role(user_id, org))
+        return await handler(event, data)
@@ -0,0 +1,157 @@
+"""Chiquvchi xabarlar navbati (fire-and-forget).
+
+Handler send_message() ni chaqiradi va kutmaydi. Yuborish fonda: har bir
+chat uchun alohida token bucket (Telegram: chatga ~1 xabar/s) va umumiy
+bucket (~30 xabar/s; OUTBOX_GLOBAL_RATE — bot bo'yicha jami, fleet da
+workerlar orasida teng bo'linadi). TelegramRetryAfter kelsa — shu chat ham,
+umumiy bucket ham retry_after ga to'xtaydi (flood-wait bot bo'yicha ham
+bo'lishi mumkin) va xabar qayta yuboriladi.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest, TelegramForbiddenError, TelegramNetworkError, TelegramRetryAfter,
+)
+
+import metrics
+from cache import LRUCache
+
+GLOBAL_RATE = float(os.environ.get("OUTBOX_GLOBAL_RATE", 25))
+CHAT_RATE = float(os.environ.get("OUTBOX_CHAT_RATE", 1))
+CHAT_BURST = int(os.environ.get("OUTBOX_CHAT_BURST", 3))
+MAX_PENDING = int(os.environ.get("OUTBOX_MAX_PENDING", 10_000))
+MAX_RETRIES = int(os.environ.get("OUTBOX_MAX_RETRIES", 5))
+
+delivery_seconds = metrics.Histogram(
+    "outbox_delivery_seconds", "Navbatga qo'yilgandan yuborilgunicha",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+sent_total = metrics.Counter("outbox_sent_total", "Yuborilgan xabarlar")
+retries_total = metrics.Counter("outbox_retries_total", "Qayta urinishlar", ("reason",))
+dropped_total = metrics.Counter("outbox_dropped_total", "Yuborilmagan xabarlar", ("reason",))
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0  # retry_after dan keyin
+
+    def take(self) -> float:
+        """Token olish; bo'lmasa — qancha kutish kerakligi (sekund)"""
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+_global = TokenBucket(GLOBAL_RATE, GLOBAL_RATE)
+# Bo'sh chatlarning bucket'lari ham biroz saqlanadi (ketma-ket xabarlar limiti uchun)
+_chat_buckets = LRUCache(max_size=10_000, ttl=60)
+_queues: dict[int, deque] = {}  # chat_id -> deque[(bot, text, kwargs, qo'yilgan vaqt)]
+_tasks: set[asyncio.Task] = set()
+_pending = 0
+
+metrics.register_gauge("outbox_pending", "Yuborilishini kutayotgan xabarlar", lambda: _pending)
+
+
+def resize(workers: int = 1):
+    """Fleet: har bir worker umumiy limitning 1/workers qismini oladi"""
+    rate = GLOBAL_RATE / max(1, workers)
+    _global.rate = _global.capacity = _global.tokens = rate
+
+
+def send_message(bot: Bot, chat_id: int, text: str, **kwargs) -> bool:
+    """Navbatga qo'yish (kutilmaydi). Navbat to'la bo'lsa — False"""
+    global _pending
+    if _pending >= MAX_PENDING:
+        dropped_total.inc("overflow")
+        return False
+    queue = _queues.get(chat_id)
+    if queue is None:
+        queue = _queues[chat_id] = deque()
+        task = asyncio.create_task(_chat_worker(chat_id, queue))
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+    queue.append((bot, text, kwargs, time.monotonic()))
+    _pending += 1
+    return True
+
+
+async def _wait(bucket: TokenBucket):
+    while (delay := bucket.take()) > 0:
+        await asyncio.sleep(delay)
+
+
+async def _chat_worker(chat_id: int, queue: deque):
+    """Bitta chat xabarlari — ketma-ket, chat va umumiy limit bilan"""
+    global _pending
+    bucket = _chat_buckets.get(chat_id)
+    if bucket is None:
+        bucket = TokenBucket(CHAT_RATE, CHAT_BURST)
+    try:
+        while queue:
+            bot, text, kwargs, queued_at = queue[0]
+            reason = await _deliver(bot, chat_id, text, kwargs, bucket)
+            queue.popleft()
+            _pending -= 1
+            if reason is None:
+                sent_total.inc()
+                delivery_seconds.observe(time.monotonic() - queued_at)
+            else:
+                dropped_total.inc(reason)
+    finally:
+        if queue:  # drain() bekor qildi
+            _pending -= len(queue)
+            dropped_total.inc("shutdown", amount=len(queue))
+        del _queues[chat_id]
+        _chat_buckets.set(chat_id, bucket)
+
+
+async def _deliver(bot: Bot, chat_id: int, text: str, kwargs: dict,
+                   bucket: TokenBucket) -> str | None:
+    """Yuborish (qayta urinishlar bilan); yuborilmasa — sababi"""
+    for attempt in range(MAX_RETRIES + 1):
+        await _wait(bucket)
+        await _wait(_global)
+        try:
+            await bot.send_message(chat_id, text, **kwargs)
+            return None
+        except TelegramRetryAfter as e:
+            until = time.monotonic() + e.retry_after
+            bucket.blocked_until = until
+            _global.blocked_until = max(_global.blocked_until, until)
+            retries_total.inc("retry_after")
+        except TelegramNetworkError:
+            await asyncio.sleep(min(2 ** attempt, 30))
+            retries_total.inc("network")
+        except TelegramForbiddenError:
+            return "forbidden"  # user botni bloklagan
+        except TelegramBadRequest as e:
+            logging.warning(f"Outbox: {chat_id} ga yuborilmadi: {e}")
+            return "bad_request"
+        except Exception:
+            logging.exception(f"Outbox: {chat_id} ga yuborishda xato")
+            return "error"
+    return "retries_exhausted"
+
+
+async def drain(timeout: float = 10.0):
+    """To'xtashdan oldin: navbatdagilarni `timeout` gacha yuborib, qolganini bekor qilish"""
+    if _tasks:
+        _, pending = await asyncio.wait(set(_tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
@@ -0,0 +1,89 @@
+"""Kartalarni fonda qayta shifrlash: eski Fernet tokenlari/matnlar va eski
+kalitlar -> joriy AEAD kaliti (cipher.py).
+
+cards id tartibida REENCRYPT_BATCH lab o'tiladi; har batch checkpoint
+(reencrypt_jobs) bilan bitta tranzaksiyada, shuning uchun qayta ishga
+tushgandan keyin to'xtagan joyidan davom etadi. CARD_KEYS ga yangi kalit
+birinchi qo'yilsa (yoki CARD_CIPHER o'zgarsa) — job boshidan. Bot shu
+paytda ishlayveradi: eski tokenlar ham o'qiladi.
+
+Tezlik REENCRYPT_ROWS_PER_SEC bilan cheklanadi (0 — o'chiq), holat super
+adminga yuboriladi (boshlanishi, har REENCRYPT_REPORT_SECONDS, tugashi).
+"""
+import asyncio
+import logging
+import os
+import time
+
+from aiogram import Bot
+
+import db
+import outbox
+
+ROWS_PER_SEC = float(os.environ.get("REENCRYPT_ROWS_PER_SEC", 200))
+BATCH = int(os.environ.get("REENCRYPT_BATCH", 200))
+REPORT_SECONDS = float(os.environ.get("REENCRYPT_REPORT_SECONDS", 600))
+
+_task: asyncio.Task | None = None
+
+
+def progress_text(job) -> str:
+    if job is None:
+        return "🔐 Qayta shifrlash hali boshlanmagan."
+    total = max(job["total"], job["rotated"])
+    percent = job["rotated"] * 100 // total if total else 100
+    status = "tugagan ✅" if job["finished_at"] else "davom etmoqda"
+    return (
+        f"🔐 Qayta shifrlash: {status}\n"
+        f"{job['rotated']}/{total} ta karta ({percent}%)\n"
+        f"Boshlangan: {job['started_at']:%Y-%m-%d %H:%M}"
+    )
+
+
+def start(bot: Bot, admin_id: int):
+    global _task
+    if ROWS_PER_SEC > 0 and _task is None:
+        _task = asyncio.create_task(_run(bot, admin_id))
+
+
+async def stop():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
+
+
+def _report(bot: Bot, admin_id: int, text: str):
+    if admin_id:
+        outbox.send_message(bot, admin_id, text)
+
+
+async def _run(bot: Bot, admin_id: int):
+    try:
+        job = await db.start_reencrypt_job()
+        if job["finished_at"]:
+            return
+        if job["total"]:
+            logging.info(f"Qayta shifrlash: {job['total']} ta karta, {job['rotated']} tayyor")
+            _report(bot, admin_id, progress_text(job))
+        reported = time.monotonic()
+        while True:
+            started = time.monotonic()
+            count = await db.reencrypt_batch(BATCH)
+            if count is None:
+                break
+            if time.monotonic() - reported >= REPORT_SECONDS:
+                reported = time.monotonic()
+                _report(bot, admin_id, progress_text(await db.get_reencrypt_job()))
+            # O'rtacha tezlik ROWS_PER_SEC dan oshmasin
+            await asyncio.sleep(max(0.0, count / ROWS_PER_SEC - (time.monotonic() - started)))
+        job = await db.get_reencrypt_job()
+        if job is not None and job["total"]:
+            logging.info(f"Qayta shifrlash tugadi: {job['rotated']} ta karta")
+            _report(bot, admin_id, progress_text(job))
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        # Keyingi ishga tushishda checkpointdan davom etadi
+        logging.exception("Qayta shifrlash to'xtadi")
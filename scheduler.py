@@ -0,0 +1,138 @@
+"""Webhook update'larini darhol tasdiqlab, fonda bajaruvchi rejalashtiruvchi.
+
+Har bir user o'z navbatiga ega — uning update'lari qat'iy ketma-ket
+bajariladi (FSM oqimlari uchun), turli userlar esa parallel. Bir vaqtda
+ishlaydigan update'lar soni `workers` bilan, navbatdagilar `max_pending`
+bilan cheklanadi: navbat to'lsa webhook javobi kutadi, kutish vaqti
+tugasa 503 qaytadi va Telegram update'ni keyinroq qayta yuboradi.
+
+Tasdiqlangan update uchun Telegram endi javobgar emas: to'xtashda close()
+vaqti ichida bajarilmaganlari yo'qoladi. Shuning uchun rejim ixtiyoriy
+(WEBHOOK_SCHEDULER=1).
+
+Bir nechta jarayon (fleet) bo'lsa, `user_lock` (db.user_lock) bitta userning
+update'lari turli jarayonlarda bir vaqtda bajarilmasligini ta'minlaydi (FSM
+holati ustma-ust yozilmaydi). Tartibni emas: ikki jarayonga tushgan ketma-ket
+update'lar istalgan tartibda bajarilishi mumkin — qat'iy tartib faqat bitta
+jarayon ichida. FSM holati aiogram tomonidan update boshida o'qiladi, shuning
+uchun qulf feed_update dan oldin. Inline so'rovlar FSM ga yozmaydi va qulflanmaydi.
+"""
+import asyncio
+import contextlib
+import logging
+import time
+from collections import deque
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+
+import metrics
+
+wait_seconds = metrics.Histogram(
+    "scheduler_wait_seconds", "Update navbatda kutgan vaqt (qabuldan bajarilishgacha)"
+)
+rejected_total = metrics.Counter(
+    "scheduler_rejected_total", "Navbat to'lgani uchun 503 qaytarilgan update'lar"
+)
+
+
+def _user_key(update: Update):
+    user = getattr(update.event, "from_user", None)
+    # Usersiz update'lar (masalan kanal postlari) bir-birini kutmaydi
+    return user.id if user else ("update", update.update_id)
+
+
+class UpdateScheduler:
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, workers: int = 16,
+                 max_pending: int = 1000, enqueue_timeout: float = 5.0, user_lock=None):
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.user_lock = user_lock
+        self.workers = workers
+        self.max_pending = max_pending
+        self.enqueue_timeout = enqueue_timeout
+
+        self._lanes: dict = {}  # user -> deque[(update, qabul vaqti)]
+        self._ready: asyncio.Queue = asyncio.Queue()  # navbati bor, hozir ishlamayotgan userlar
+        self._pending = 0
+        self._in_flight = 0
+        self._space = asyncio.Condition()
+        self._tasks: list[asyncio.Task] = []
+
+        metrics.register_gauge("scheduler_queue_depth", "Navbatdagi (boshlanmagan) update'lar",
+                               lambda: self._pending)
+        metrics.register_gauge("scheduler_in_flight", "Hozir bajarilayotgan update'lar",
+                               lambda: self._in_flight)
+        metrics.register_gauge("scheduler_active_users", "Navbati bor yoki ishlayotgan userlar",
+                               lambda: len(self._lanes))
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self, timeout: float = 10.0):
+        """Navbatdagilarni `timeout` gacha tugatib, workerlarni to'xtatish"""
+        deadline = time.monotonic() + timeout
+        while (self._pending or self._in_flight) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def submit(self, update: Update) -> bool:
+        """Navbatga qo'yish; joy bo'shamasa (enqueue_timeout) — False"""
+        if self._pending >= self.max_pending:
+            async with self._space:
+                try:
+                    await asyncio.wait_for(
+                        self._space.wait_for(lambda: self._pending < self.max_pending),
+                        self.enqueue_timeout,
+                    )
+                except asyncio.TimeoutError:
+                    rejected_total.inc()
+                    return False
+
+        key = _user_key(update)
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = deque()
+            self._ready.put_nowait(key)
+        lane.append((update, time.monotonic()))
+        self._pending += 1
+        return True
+
+    async def _worker(self):
+        while True:
+            key = await self._ready.get()
+            lane = self._lanes[key]
+            update, queued_at = lane.popleft()
+            self._pending -= 1
+            self._in_flight += 1
+            async with self._space:
+                self._space.notify()
+            wait_seconds.observe(time.monotonic() - queued_at)
+            try:
+                async with self._lock(key, update):
+                    await self.dispatcher.feed_update(self.bot, update)
+            except Exception:
+                logging.exception(f"Update {update.update_id} bajarilmadi")
+            finally:
+                self._in_flight -= 1
+                # Userning keyingi update'i — faqat shu tugagach (tartib saqlanadi)
+                if lane:
+                    self._ready.put_nowait(key)
+                else:
+                    del self._lanes[key]
+
+    def _lock(self, key, update: Update):
+        if (self.user_lock is None or not isinstance(key, int)
+                or update.event_type in ("inline_query", "chosen_inline_result")):
+            return contextlib.nullcontext()
+        return self.user_lock(key)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """aiohttp webhook handler: qabul qilish va darhol 200"""
+        update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        if not await self.submit(update):
+            return web.Response(status=503)
+        return web.json_response({})
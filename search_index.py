@@ -0,0 +1,340 @@
+"""Inline qidiruv uchun xotiradagi indeks (FIO bo'yicha n-gram).
+
+Tashkilotlar kerak bo'lganda (lazy) db.py orqali yuklanadi va keyin db.py
+dagi yozish funksiyalari indeksni joyida yangilab boradi. Shuning uchun
+inline so'rov bazaga umuman murojaat qilmaydi.
+"""
+import bisect
+import heapq
+import itertools
+import os
+import sys
+from collections import OrderedDict
+
+# SEARCH_INDEX=0 — indeks o'chiriladi, inline so'rovlar to'g'ridan-to'g'ri SQL dan
+ENABLED = os.environ.get("SEARCH_INDEX", "1") != "0"
+
+# Xotira chegarasi: indeksdagi kartalar soni shundan oshsa, eng kam
+# ishlatilgan tashkilotlar chiqarib tashlanadi (keyin qayta yuklanadi)
+MAX_CARDS = int(os.environ.get("SEARCH_INDEX_MAX_CARDS", 1_000_000))
+
+_EMPTY = frozenset()
+
+
+def _normalize(text: str) -> str:
+    """Qidiruv kaliti: kichik harf, bo'shliqlar bittaga (so'rov ham shunday)"""
+    return " ".join(text.split()).lower()
+
+
+class _Participant:
+    __slots__ = ("id", "org_id", "fio", "key", "card_ids", "cards")
+
+    def __init__(self, pid: int, org_id: int, fio: str):
+        self.id = pid
+        self.org_id = org_id
+        self.fio = fio
+        self.key = _normalize(fio)
+        self.card_ids = ()
+        self.cards = ()
+
+
+class _Org:
+    __slots__ = ("name", "participants", "grams", "card_count")
+
+    def __init__(self, name: str):
+        self.name = sys.intern(name)
+        self.participants: dict[int, _Participant] = {}  # id tartibida
+        self.grams: dict[str, set[int]] = {}
+        self.card_count = 0
+
+
+_orgs: "OrderedDict[int, _Org]" = OrderedDict()  # LRU tartibida
+_participants: dict[int, _Participant] = {}
+_user_orgs: dict[int, set[int]] = {}
+_all_loaded = False
+_stale: set[int] = set()  # _all_loaded da boshqa jarayon o'zgartirgan (yoki yangi) orglar
+_all_over_budget = False  # barcha kartalar MAX_CARDS dan ko'p — super admin SQL dan
+_total_cards = 0
+_epoch = 0  # clear() da oshadi — yuklash paytida indeks tozalanganini bilish uchun
+
+
+def _grams(key: str) -> set[str]:
+    """Trigrammalar (1-2 harflik so'rovlar indekssiz — _candidates)"""
+    return {key[i:i + 3] for i in range(len(key) - 2)}
+
+
+def _index_fio(org: _Org, p: _Participant):
+    for gram in _grams(p.key):
+        org.grams.setdefault(gram, set()).add(p.id)
+
+
+def _unindex_fio(org: _Org, p: _Participant):
+    for gram in _grams(p.key):
+        ids = org.grams.get(gram)
+        if ids is not None:
+            ids.discard(p.id)
+            if not ids:
+                del org.grams[gram]
+
+
+def epoch() -> int:
+    return _epoch
+
+
+# --- Yuklash ---
+
+def is_org_loaded(org_id: int) -> bool:
+    return org_id in _orgs
+
+
+def is_all_loaded() -> bool:
+    return _all_loaded
+
+
+def get_user_orgs(telegram_id: int) -> set[int] | None:
+    return _user_orgs.get(telegram_id)
+
+
+def stale_org_ids() -> list[int]:
+    """Qayta yuklanishi kerak bo'lgan orglar (faqat _all_loaded da)"""
+    return list(_stale)
+
+
+def is_all_over_budget() -> bool:
+    return _all_over_budget
+
+
+def all_org_ids() -> list[int]:
+    return list(_orgs)
+
+
+def mark_stale(org_ids):
+    """Hammasini yuklash paytida o'zgargan orglar — keyingi so'rovda alohida yuklanadi"""
+    if _all_loaded:
+        _stale.update(org_ids)
+
+
+def load_user_orgs(telegram_id: int, org_ids):
+    _user_orgs[telegram_id] = set(org_ids)
+
+
+def check_all_budget(card_count: int) -> bool:
+    """Hammasini yuklashdan oldin: sig'maydimi (sig'masa — restartgacha SQL dan)"""
+    global _all_over_budget
+    _all_over_budget = card_count > MAX_CARDS
+    return not _all_over_budget
+
+
+def load_orgs(rows, org_ids=None):
+    """rows: org_id, org_name, pid, fio, card_id, card_number (tartiblangan).
+    org_ids — so'ralgan tashkilotlar (None — hammasi): ular chiqarib tashlanmaydi"""
+    global _all_loaded, _total_cards
+    for row in rows:
+        org_id = row["org_id"]
+        org = _orgs.get(org_id)
+        if org is None:
+            org = _orgs[org_id] = _Org(row["org_name"])
+        pid = row["pid"]
+        if pid is None:
+            continue
+        p = org.participants.get(pid)
+        if p is None:
+            p = _Participant(pid, org_id, row["fio"])
+            org.participants[pid] = p
+            _participants[pid] = p
+            _index_fio(org, p)
+        if row["card_id"] is not None and row["card_id"] not in p.card_ids:
+            p.card_ids += (row["card_id"],)
+            p.cards += (row["card_number"],)
+            org.card_count += 1
+            _total_cards += 1
+    if org_ids is None:
+        _all_loaded = True
+        _stale.clear()
+        pinned = set(_orgs)
+    else:
+        pinned = set(org_ids)
+        _stale.difference_update(pinned)
+    _evict(pinned)
+
+
+def _drop_org(org_id: int):
+    global _total_cards
+    org = _orgs.pop(org_id, None)
+    if org is None:
+        return
+    for pid in org.participants:
+        _participants.pop(pid, None)
+    _total_cards -= org.card_count
+
+
+def _evict(pinned=_EMPTY):
+    """Eng kam ishlatilganlardan boshlab; hozir so'ralganlar (pinned) qoladi"""
+    global _all_loaded
+    for org_id in list(_orgs):
+        if _total_cards <= MAX_CARDS:
+            break
+        if org_id not in pinned:
+            _drop_org(org_id)
+            _all_loaded = False
+            _stale.clear()
+
+
+def clear():
+    """Hammasini unutish (masalan LISTEN uzilib, xabarlar yo'qolganda)"""
+    global _all_loaded, _total_cards, _epoch
+    _orgs.clear()
+    _participants.clear()
+    _user_orgs.clear()
+    _stale.clear()
+    _all_loaded = False
+    _total_cards = 0
+    _epoch += 1
+
+
+# --- Yozishlar (db.py chaqiradi) ---
+
+def add_org(org_id: int, name: str):
+    """Yangi tashkilot — bo'sh, demak to'liq yuklangan hisoblanadi"""
+    _drop_org(org_id)
+    _orgs[org_id] = _Org(name)
+
+
+def rename_org(org_id: int, name: str):
+    org = _orgs.get(org_id)
+    if org is not None:
+        org.name = sys.intern(name)
+
+
+def delete_org(org_id: int):
+    _drop_org(org_id)
+    _stale.discard(org_id)
+    for org_ids in _user_orgs.values():
+        org_ids.discard(org_id)
+
+
+def add_user_to_org(telegram_id: int, org_id: int):
+    org_ids = _user_orgs.get(telegram_id)
+    if org_ids is not None:
+        org_ids.add(org_id)
+
+
+def remove_user_from_org(telegram_id: int, org_id: int):
+    org_ids = _user_orgs.get(telegram_id)
+    if org_ids is not None:
+        org_ids.discard(org_id)
+
+
+def invalidate_org(org_id: int):
+    """Boshqa jarayon o'zgartirdi — keyingi so'rovda faqat shu org qayta yuklanadi.
+    Hammasi yuklangan bo'lsa, noma'lum (yangi yaratilgan) org ham qo'shiladi"""
+    _drop_org(org_id)
+    if _all_loaded:
+        _stale.add(org_id)
+
+
+def invalidate_user(telegram_id: int):
+    _user_orgs.pop(telegram_id, None)
+
+
+def add_participant(org_id: int, participant_id: int, fio: str):
+    org = _orgs.get(org_id)
+    if org is not None and participant_id not in org.participants:
+        p = _Participant(participant_id, org_id, fio)
+        org.participants[participant_id] = p
+        _participants[participant_id] = p
+        _index_fio(org, p)
+
+
+def rename_participant(participant_id: int, fio: str):
+    p = _participants.get(participant_id)
+    if p is not None:
+        org = _orgs[p.org_id]
+        _unindex_fio(org, p)
+        p.fio = fio
+        p.key = _normalize(fio)
+        _index_fio(org, p)
+
+
+def delete_participant(participant_id: int):
+    global _total_cards
+    p = _participants.pop(participant_id, None)
+    if p is not None:
+        org = _orgs[p.org_id]
+        _unindex_fio(org, p)
+        del org.participants[participant_id]
+        org.card_count -= len(p.cards)
+        _total_cards -= len(p.cards)
+
+
+def add_card(participant_id: int, card_id: int, card_number: str):
+    global _total_cards
+    p = _participants.get(participant_id)
+    if p is not None and card_id not in p.card_ids:
+        p.card_ids += (card_id,)
+        p.cards += (card_number,)
+        _orgs[p.org_id].card_count += 1
+        _total_cards += 1
+        _evict()
+
+
+def delete_card(participant_id: int, card_id: int):
+    global _total_cards
+    p = _participants.get(participant_id)
+    if p is not None and card_id in p.card_ids:
+        i = p.card_ids.index(card_id)
+        p.card_ids = p.card_ids[:i] + p.card_ids[i + 1:]
+        p.cards = p.cards[:i] + p.cards[i + 1:]
+        _orgs[p.org_id].card_count -= 1
+        _total_cards -= 1
+
+
+# --- Qidiruv ---
+
+def _candidates(org: _Org, search: str):
+    if not search:
+        return org.participants.keys()
+    if len(search) < 3:
+        # SQL dagi ILIKE '%..%' kabi — istalgan joyidan (faqat so'z boshidan emas)
+        return [pid for pid, p in org.participants.items() if search in p.key]
+    sets = sorted(
+        (org.grams.get(g, _EMPTY) for g in _grams(search) if len(g) == 3),
+        key=len,
+    )
+    if not sets or not sets[0]:
+        return _EMPTY
+    return set.intersection(*sets)
+
+
+def search(org_ids, text: str, limit: int = 50, after_id: int = 0) -> list[dict]:
+    """Kartasi bor, FIO si mos keladigan ishtirokchilar (id > after_id, id tartibida)"""
+    search = _normalize(text)
+    streams = []
+    for org_id in org_ids:
+        org = _orgs.get(org_id)
+        if org is None:
+            continue
+        _orgs.move_to_end(org_id)
+        ids = _candidates(org, search)
+        if not search:
+            streams.append(itertools.dropwhile(lambda pid: pid <= after_id, ids))
+        else:
+            ids = sorted(ids)
+            streams.append(ids[bisect.bisect_right(ids, after_id):])
+
+    result = []
+    for pid in heapq.merge(*streams):
+        p = _participants[pid]
+        if not p.cards:
+            continue
+        if search not in p.key:
+            continue
+        result.append({
+            "id": p.id,
+            "fio": p.fio,
+            "org_name": _orgs[p.org_id].name,
+            "cards": list(p.cards),
+        })
+        if len(result) >= limit:
+            break
+    return result
@@ -0,0 +1,237 @@
+"""Benchmark: soxta ma'lumot bilan asosiy yo'llarni o'lchash (JSON natija).
+
+Faqat lokal/sinov bazasida ishlating — --seed ma'lumot qo'shadi,
+--reset esa barcha jadvallarni tozalaydi. Telegram ga hech narsa
+yuborilmaydi (FakeBot).
+
+    python -m tools.benchmark --reset --seed --orgs 1000 --participants 100 > bench.json
+    python -m tools.benchmark --iterations 500 --out bench.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import resource
+import sys
+import time
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from aiogram import Bot
+from aiogram.types import InlineQuery, User
+
+import db
+import search_index
+from handlers import inline
+from tools.stats import summary
+
+FIRST_NAMES = [
+    "Jasur", "Aziz", "Dilshod", "Bekzod", "Sardor", "Otabek", "Nodir", "Shoxrux",
+    "Malika", "Dilnoza", "Gulnora", "Nigora", "Madina", "Zarina", "Kamola", "Sevara",
+]
+LAST_NAMES = [
+    "Aliyev", "Karimov", "Rahimov", "Tursunov", "Yusupov", "Qodirov", "Ergashev",
+    "Sobirov", "Nazarov", "Xolmatov", "Abdullayev", "Mirzayev", "Ismoilov", "Hasanov",
+]
+MEMBER_ID_BASE = 9_000_000_000  # soxta userlar haqiqiy Telegram id lari bilan to'qnashmasin
+
+
+class FakeBot(Bot):
+    """Bot API ga so'rov yubormaydi — har qanday metod True qaytaradi"""
+
+    def __init__(self):
+        super().__init__(token="123456:BENCHMARK-fake-token")
+        self.calls = 0
+
+    async def __call__(self, method, request_timeout=None):
+        self.calls += 1
+        return True
+
+
+def _card() -> str:
+    return "8600" + "".join(random.choices("0123456789", k=12))
+
+
+def _fio() -> str:
+    return f"{random.choice(LAST_NAMES)} {random.choice(FIRST_NAMES)} {random.randint(1, 999)}"
+
+
+async def reset():
+    await db.pool.execute(
+        "TRUNCATE cards, participants, user_orgs, organizations, blocked_users "
+        "RESTART IDENTITY CASCADE"
+    )
+
+
+async def seed(orgs: int, members: int, participants: int, cards: int):
+    """orgs ta tashkilot; har birida members ta a'zo, participants ta ishtirokchi,
+    har ishtirokchida cards ta (haqiqiy shifrlangan) karta"""
+    if await db.pool.fetchval("SELECT EXISTS (SELECT 1 FROM organizations)"):
+        sys.exit("Baza bo'sh emas — --reset bilan ishga tushiring")
+
+    org_ids = await db.pool.fetch(
+        """INSERT INTO organizations (name, unique_id, owner_id)
+           SELECT 'Jamoa ' || g, substr(md5(random()::text), 1, 16), $2 + g * $3
+           FROM generate_series(1, $1) g
+           RETURNING id, owner_id""",
+        orgs, MEMBER_ID_BASE, members + 1
+    )
+    async with db.pool.acquire() as conn:
+        await conn.copy_records_to_table(
+            "user_orgs", columns=["telegram_id", "org_id", "full_name"],
+            records=[
+                (row["owner_id"] + k, row["id"], f"User {row['owner_id'] + k}")
+                for row in org_ids for k in range(members + 1)
+            ],
+        )
+        pids = await conn.fetch(
+            """INSERT INTO participants (org_id, fio)
+               SELECT * FROM unnest($1::int[], $2::text[])
+               RETURNING id""",
+            [row["id"] for row in org_ids for _ in range(participants)],
+            [_fio() for _ in range(orgs * participants)],
+        )
+        records = []
+        for row in pids:
+            for number in {_card() for _ in range(cards)}:
+                records.append(
+                    (row["id"], db.encrypt_card(number), db.card_hash(number), number[-4:])
+                )
+        await conn.copy_records_to_table(
+            "cards", columns=["participant_id", "card_number", "card_hash", "last4"],
+            records=records,
+        )
+        await conn.execute("ANALYZE")
+
+
+async def measure(fn, iterations: int, before=None) -> dict:
+    samples = []
+    for _ in range(iterations):
+        if before:
+            before()
+        start = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - start)
+    return summary(samples)
+
+
+async def bench_init_db(runs: int) -> dict:
+    await db.close_db()
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        await db.init_db()
+        samples.append(time.perf_counter() - start)
+        await db.close_db()
+    await db.init_db()
+    return summary(samples)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reset", action="store_true", help="jadvallarni tozalash")
+    parser.add_argument("--seed", action="store_true", help="soxta ma'lumot qo'shish")
+    parser.add_argument("--orgs", type=int, default=1000)
+    parser.add_argument("--members", type=int, default=20, help="har tashkilotda a'zolar")
+    parser.add_argument("--participants", type=int, default=100, help="har tashkilotda")
+    parser.add_argument("--cards", type=int, default=2, help="har ishtirokchida")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--cold-runs", type=int, default=5, help="init_db o'lchovlari soni")
+    parser.add_argument("--out", help="JSON faylga yozish (default — stdout)")
+    parser.add_argument("--random-seed", type=int, default=1)
+    args = parser.parse_args()
+    random.seed(args.random_seed)
+
+    await db.init_db()
+    if args.reset:
+        await reset()
+    if args.seed:
+        start = time.perf_counter()
+        await seed(args.orgs, args.members, args.participants, args.cards)
+        print(f"seed: {time.perf_counter() - start:.1f} s", file=sys.stderr)
+
+    dataset = {
+        name: await db.pool.fetchval(f"SELECT count(*) FROM {name}")
+        for name in ("organizations", "user_orgs", "participants", "cards")
+    }
+    members = [row["telegram_id"] for row in await db.pool.fetch(
+        "SELECT telegram_id FROM user_orgs ORDER BY random() LIMIT 1000"
+    )]
+    participant_ids = [row["id"] for row in await db.pool.fetch(
+        "SELECT id FROM participants ORDER BY random() LIMIT 1000"
+    )]
+    if not members or not participant_ids:
+        sys.exit("Ma'lumot yo'q — --seed bilan ishga tushiring")
+    card_rows = await db.pool.fetch(
+        "SELECT id, participant_id, card_number FROM cards ORDER BY random() LIMIT 1000"
+    )
+    numbers = await db._card_numbers(card_rows, "id")
+    sample_cards = [(row["participant_id"], numbers[row["id"]]) for row in card_rows]
+    org_rows = await db._fetch_index_rows([
+        await db.pool.fetchval("SELECT org_id FROM participants WHERE id = $1", participant_ids[0])
+    ])
+
+    bot = FakeBot()
+    terms = ["", "ali", "jasur", "ov", "karimov mal", "xyz"]
+
+    def inline_query(cache: bool):
+        async def run():
+            if not cache:
+                inline._rendered.clear()
+            user_id = random.choice(members)
+            query = InlineQuery(
+                id=str(random.getrandbits(32)),
+                from_user=User(id=user_id, is_bot=False, first_name="Bench"),
+                query=random.choice(terms),
+                offset="",
+            ).as_(bot)
+            await inline.inline_handler(query)
+        return run
+
+    async def card_exists():
+        participant_id, number = random.choice(sample_cards)
+        await db.card_exists(participant_id, number)
+
+    async def get_cards():
+        await db.get_cards(random.choice(participant_ids))
+
+    async def group_rows():
+        db._group_participants_cards(org_rows, await db._card_numbers(org_rows))
+
+    n = args.iterations
+    results = {
+        "init_db_cold": await bench_init_db(args.cold_runs),
+        "inline_handler": await measure(inline_query(cache=False), n),
+        "inline_handler_cached": await measure(inline_query(cache=True), n),
+        "_group_participants_cards": await measure(group_rows, n, db.card_cache.clear),
+        "_group_participants_cards_cached": await measure(group_rows, n),
+        "card_exists": await measure(card_exists, n),
+        "get_cards": await measure(get_cards, n, db.card_cache.clear),
+    }
+    await db.close_db()
+
+    report = {
+        "dataset": dataset,
+        "config": {
+            "search_index": search_index.ENABLED,
+            "iterations": n,
+            "group_rows": len(org_rows),
+        },
+        "python": platform.python_version(),
+        "results": results,
+        # Linux da ru_maxrss — KB
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "bot_calls": bot.calls,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
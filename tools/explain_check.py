@@ -0,0 +1,125 @@
+"""db.py dagi har bir so'rovning rejasini tekshirish (EXPLAIN).
+
+Katta jadvalda Seq Scan ishlatgan so'rov bo'lsa — xato bilan chiqadi.
+Faqat lokal/sinov bazasida ishlating (--seed ma'lumot qo'shadi).
+PostgreSQL 16+ kerak (EXPLAIN GENERIC_PLAN).
+
+    python -m tools.explain_check --seed 2000
+"""
+import argparse
+import ast
+import asyncio
+import json
+import os
+import sys
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import db
+
+# To'liq o'qish kutilgan funksiyalar (admin ro'yxatlari, indeksni to'liq yuklash)
+FULL_SCAN_ALLOWED = {
+    "get_all_participants",
+    "load_blocked_users",
+    "_fetch_all_index_rows",
+    "_count_index_cards",
+    "migrate",
+    "start_reencrypt_job",
+}
+
+_DML = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+
+def collect_queries(path: str) -> list[tuple[str, str]]:
+    """db.py dan (funksiya nomi, SQL) juftliklari"""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    queries = []
+    for func in ast.walk(tree):
+        if not isinstance(func, ast.AsyncFunctionDef) or func.name.startswith("_m0"):
+            continue
+        for node in ast.walk(func):
+            if not isinstance(node, ast.Call) or not isinstance(node.func, ast.Attribute):
+                continue
+            if not node.args or not isinstance(node.args[0], ast.Constant):
+                continue
+            sql = node.args[0].value
+            if isinstance(sql, str) and sql.lstrip().upper().startswith(_DML):
+                queries.append((func.name, " ".join(sql.split())))
+    return queries
+
+
+async def seed(conn, orgs: int, participants: int, cards: int):
+    """Rejalashtiruvchi uchun soxta ma'lumot (kartalar shifrlanmaydi)"""
+    await conn.execute(
+        """INSERT INTO organizations (name, unique_id, owner_id)
+           SELECT 'org ' || g, substr(md5(random()::text), 1, 16), g
+           FROM generate_series(1, $1) g""",
+        orgs
+    )
+    await conn.execute(
+        """INSERT INTO participants (org_id, fio)
+           SELECT o.id, 'fio ' || md5(random()::text)
+           FROM organizations o, generate_series(1, $1)""",
+        participants
+    )
+    await conn.execute(
+        """INSERT INTO cards (participant_id, card_number, card_hash)
+           SELECT p.id, 'x', decode(md5(random()::text), 'hex')
+           FROM participants p, generate_series(1, $1)""",
+        cards
+    )
+    await conn.execute(
+        """INSERT INTO user_orgs (telegram_id, org_id)
+           SELECT o.owner_id, o.id FROM organizations o
+           ON CONFLICT DO NOTHING"""
+    )
+    await conn.execute("ANALYZE")
+
+
+def seq_scans(plan: dict):
+    if plan.get("Node Type") == "Seq Scan":
+        yield plan["Relation Name"]
+    for child in plan.get("Plans", []):
+        yield from seq_scans(child)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seed", type=int, default=0, metavar="ORGS",
+                        help="shuncha tashkilot (har birida 50 ishtirokchi, 2 karta) qo'shish")
+    parser.add_argument("--min-rows", type=int, default=10_000,
+                        help="shundan katta jadvallarda Seq Scan taqiqlanadi")
+    args = parser.parse_args()
+
+    await db.init_db()
+    failures = 0
+    async with db.pool.acquire() as conn:
+        if args.seed:
+            await seed(conn, args.seed, 50, 2)
+        sizes = {
+            row["relname"]: row["reltuples"]
+            for row in await conn.fetch(
+                "SELECT relname, reltuples FROM pg_class WHERE relkind = 'r'"
+            )
+        }
+        path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "db.py")
+        for name, sql in collect_queries(path):
+            raw = await conn.fetchval(f"EXPLAIN (GENERIC_PLAN, FORMAT JSON) {sql}")
+            plan = json.loads(raw)[0]["Plan"]
+            bad = [
+                rel for rel in seq_scans(plan)
+                if sizes.get(rel, 0) >= args.min_rows
+            ]
+            if bad and name not in FULL_SCAN_ALLOWED:
+                failures += 1
+                print(f"FAIL {name}: Seq Scan on {', '.join(sorted(set(bad)))}\n    {sql}")
+            else:
+                print(f"ok   {name}")
+    await db.close_db()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,394 @@
+"""api.telegram.org o'rniga lokal soxta Bot API server + yuklama generatori.
+
+Bot shu serverga TELEGRAM_API_URL orqali ulanadi; tarmoq kerak emas.
+Har bir chaqiruv yoziladi, kechikish va 429 (flood) xatolari sozlanadi.
+
+    # 1) soxta server + yuklama (polling rejimidagi botni kutadi)
+    python -m tools.fake_telegram --mode polling --users 200 --from-db
+    # 2) boshqa terminalda bot
+    TELEGRAM_API_URL=http://127.0.0.1:8081 python bot.py
+
+Webhook rejimi: botni RENDER_EXTERNAL_URL=http://127.0.0.1:10000 bilan
+ishga tushiring va --mode webhook bering — update'lar setWebhook da
+berilgan manzilga POST qilinadi. --mode serve — faqat server (qo'lda sinash).
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+
+from aiohttp import ClientSession, web
+
+from tools.stats import summary
+
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "Fake", "username": "fake_team_cards_bot"}
+USER_ID_BASE = 9_000_000_000  # tools.benchmark dagi soxta userlar bilan bir xil oraliq
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+class FakeTelegram:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0,
+                 flood_rate: float = 0.0, retry_after: int = 1):
+        self.latency = latency
+        self.jitter = jitter
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+
+        self.calls: list[tuple[float, str, dict]] = []
+        self.floods = Counter()
+        self.webhook_url: str | None = None
+        self.webhook_set = asyncio.Event()
+        self.polling_started = asyncio.Event()
+
+        self._update_id = 0
+        self._message_id = 0
+        self._callback_id = 0
+        self._updates: list[dict] = []
+        self._new_updates = asyncio.Event()
+
+        # Javob kechikishi: update yuborilgandan botning birinchi javobigacha
+        self._pending: dict[str, float] = {}  # "chat:<id>" / "inline:<id>" -> yuborilgan vaqt
+        self._waiters: dict[str, asyncio.Future] = {}
+        self._callback_chat: dict[str, str] = {}
+        self.reply_latency: list[float] = []
+
+    # --- Server ---
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        app.router.add_get("/bot{token}/{method}", self.handle)
+        app.router.add_get("/_stats", self.handle_stats)
+        return app
+
+    async def handle(self, request):
+        method = request.match_info["method"]
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = {k: v for k, v in (await request.post()).items()}
+
+        if method == "getUpdates":
+            self.polling_started.set()
+            return self._ok(await self._get_updates(params))
+
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+        if self.flood_rate and random.random() < self.flood_rate:
+            self.floods[method] += 1
+            return web.json_response({
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }, status=429)
+
+        self.calls.append((time.monotonic(), method, params))
+        self._track_reply(method, params)
+
+        if method == "getMe":
+            return self._ok(BOT_USER)
+        if method in ("sendMessage", "editMessageText"):
+            return self._ok(self._message(_int(params.get("chat_id")), params.get("text", ""),
+                                          _int(params.get("message_id"))))
+        if method == "getChat":
+            chat_id = _int(params.get("chat_id"))
+            return self._ok({"id": chat_id, "type": "private", "first_name": f"User {chat_id}",
+                             "accent_color_id": 0, "max_reaction_count": 11})
+        if method == "setWebhook":
+            self.webhook_url = params.get("url")
+            self.webhook_set.set()
+            return self._ok(True)
+        if method in ("deleteWebhook", "answerInlineQuery", "answerCallbackQuery"):
+            return self._ok(True)
+        return web.json_response(
+            {"ok": False, "error_code": 404, "description": "Not Found: method not found"},
+            status=404,
+        )
+
+    async def handle_stats(self, request):
+        return web.json_response(self.report())
+
+    @staticmethod
+    def _ok(result):
+        return web.json_response({"ok": True, "result": result})
+
+    def _message(self, chat_id, text: str, message_id=None, from_user=None) -> dict:
+        if message_id is None:
+            self._message_id += 1
+            message_id = self._message_id
+        return {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": from_user or BOT_USER,
+            "text": text,
+        }
+
+    async def _get_updates(self, params: dict) -> list[dict]:
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+        self._updates = [u for u in self._updates if u["update_id"] >= offset]
+        if not self._updates and timeout:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:limit]
+
+    # --- Javob kechikishini kuzatish ---
+
+    def _track_reply(self, method: str, params: dict):
+        if method in ("sendMessage", "editMessageText"):
+            key = f"chat:{params.get('chat_id')}"
+        elif method == "answerCallbackQuery":
+            key = self._callback_chat.pop(params.get("callback_query_id"), None)
+        elif method == "answerInlineQuery":
+            key = f"inline:{params.get('inline_query_id')}"
+        else:
+            return
+        sent_at = self._pending.pop(key, None) if key else None
+        if sent_at is not None:
+            self.reply_latency.append(time.monotonic() - sent_at)
+        waiter = self._waiters.pop(key, None) if key else None
+        if waiter and not waiter.done():
+            waiter.set_result(None)
+
+    def _reply_key(self, update: dict) -> str:
+        if "message" in update:
+            return f"chat:{update['message']['chat']['id']}"
+        if "callback_query" in update:
+            cq = update["callback_query"]
+            key = f"chat:{cq['message']['chat']['id']}"
+            self._callback_chat[cq["id"]] = key
+            return key
+        return f"inline:{update['inline_query']['id']}"
+
+    # --- Update'lar ---
+
+    def user(self, telegram_id: int) -> dict:
+        return {"id": telegram_id, "is_bot": False, "first_name": f"User {telegram_id}",
+                "username": f"user{telegram_id}"}
+
+    def message(self, telegram_id: int, text: str) -> dict:
+        msg = self._message(telegram_id, text, from_user=self.user(telegram_id))
+        if text.startswith("/"):
+            msg["entities"] = [{"type": "bot_command", "offset": 0,
+                                "length": len(text.split()[0])}]
+        return {"message": msg}
+
+    def callback(self, telegram_id: int, data: str) -> dict:
+        self._callback_id += 1
+        return {"callback_query": {
+            "id": str(self._callback_id),
+            "from": self.user(telegram_id),
+            "chat_instance": str(telegram_id),
+            "data": data,
+            "message": self._message(telegram_id, "..."),
+        }}
+
+    def inline(self, telegram_id: int, query: str) -> dict:
+        return {"inline_query": {
+            "id": str(random.getrandbits(63)),
+            "from": self.user(telegram_id),
+            "query": query,
+            "offset": "",
+            "chat_type": "sender",
+        }}
+
+    def push(self, update: dict) -> dict:
+        """update_id berish va javob kechikishini kuzatishni boshlash"""
+        self._update_id += 1
+        update = {"update_id": self._update_id, **update}
+        self._pending[self._reply_key(update)] = time.monotonic()
+        return update
+
+    def enqueue(self, update: dict):
+        """Polling: keyingi getUpdates da qaytariladi"""
+        self._updates.append(update)
+        self._new_updates.set()
+
+    def wait_reply(self, update: dict) -> asyncio.Future:
+        key = self._reply_key(update)
+        waiter = self._waiters.get(key)
+        if waiter is None or waiter.done():
+            waiter = self._waiters[key] = asyncio.get_running_loop().create_future()
+        return waiter
+
+    def report(self) -> dict:
+        return {
+            "calls": dict(Counter(method for _, method, _ in self.calls)),
+            "floods": dict(self.floods),
+            "reply_latency": summary(self.reply_latency),
+            "unanswered": len(self._pending),
+        }
+
+
+# --- Ssenariylar ---
+
+def deep_link_start(tg: FakeTelegram, telegram_id: int, code: str) -> list[dict]:
+    return [tg.message(telegram_id, f"/start {code}")]
+
+
+def inline_burst(tg: FakeTelegram, telegram_id: int, word: str) -> list[dict]:
+    """Harf-harf yozish: "a", "al", "ali", ..."""
+    return [tg.inline(telegram_id, word[:i]) for i in range(1, len(word) + 1)]
+
+
+def add_participant_flow(tg: FakeTelegram, owner_id: int, org_id: int,
+                         cards: int = 2) -> list[dict]:
+    steps = [
+        tg.callback(owner_id, f"add_participant:{org_id}"),
+        tg.message(owner_id, f"Sinov Ishtirokchi {random.randint(1, 99999)}"),
+    ]
+    steps += [
+        tg.message(owner_id, "8600" + "".join(random.choices("0123456789", k=12)))
+        for _ in range(cards)
+    ]
+    steps.append(tg.callback(owner_id, "done"))
+    return steps
+
+
+class Load:
+    def __init__(self, tg: FakeTelegram, mode: str, reply_timeout: float):
+        self.tg = tg
+        self.mode = mode
+        self.reply_timeout = reply_timeout
+        self.post_latency: list[float] = []
+        self.post_errors = Counter()
+        self._session: ClientSession | None = None
+
+    async def deliver(self, update: dict, wait: bool):
+        update = self.tg.push(update)
+        waiter = self.tg.wait_reply(update) if wait else None
+        if self.mode == "polling":
+            self.tg.enqueue(update)
+        else:
+            start = time.monotonic()
+            try:
+                async with self._session.post(self.tg.webhook_url, json=update) as resp:
+                    await resp.read()
+                    if resp.status != 200:
+                        self.post_errors[resp.status] += 1
+            except Exception as e:
+                self.post_errors[type(e).__name__] += 1
+            self.post_latency.append(time.monotonic() - start)
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(waiter, self.reply_timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def user_session(self, telegram_id: int, code: str, owned_org: int | None,
+                           words: list[str]):
+        for update in deep_link_start(self.tg, telegram_id, code):
+            await self.deliver(update, wait=True)
+        for update in inline_burst(self.tg, telegram_id, random.choice(words)):
+            await self.deliver(update, wait=False)
+            await asyncio.sleep(random.uniform(0.05, 0.2))  # yozish tezligi
+        if owned_org is not None:
+            for update in add_participant_flow(self.tg, telegram_id, owned_org):
+                await self.deliver(update, wait=True)
+
+    async def run(self, users: list[tuple[int, str, int | None]], concurrency: int,
+                  words: list[str]):
+        self._session = ClientSession()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(user):
+            async with semaphore:
+                await self.user_session(*user, words)
+
+        try:
+            await asyncio.gather(*(one(u) for u in users))
+        finally:
+            await self._session.close()
+
+
+async def _load_users(count: int) -> list[tuple[int, str, int | None]]:
+    """Bazadagi tashkilotlardan (tools.benchmark --seed): a'zolar va egalar"""
+    import db  # faqat --from-db da (ENCRYPTION_KEY, DATABASE_URL kerak)
+    await db.init_db()
+    try:
+        rows = await db.pool.fetch(
+            """SELECT uo.telegram_id, o.unique_id,
+                      CASE WHEN o.owner_id = uo.telegram_id THEN o.id END AS owned_org
+               FROM user_orgs uo JOIN organizations o ON o.id = uo.org_id
+               ORDER BY random() LIMIT $1""",
+            count
+        )
+    finally:
+        await db.close_db()
+    return [(r["telegram_id"], r["unique_id"], r["owned_org"]) for r in rows]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--mode", choices=("polling", "webhook", "serve"), default="polling")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--flood-rate", type=float, default=0, help="429 ehtimoli (0..1)")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--reply-timeout", type=float, default=10)
+    parser.add_argument("--from-db", action="store_true",
+                        help="userlar va deep-link kodlarini bazadan olish")
+    parser.add_argument("--words", default="ali,karimov,jasur,malika,ov,xyz")
+    parser.add_argument("--out", help="JSON hisobotni faylga yozish")
+    args = parser.parse_args()
+
+    tg = FakeTelegram(args.latency_ms / 1000, args.jitter_ms / 1000,
+                      args.flood_rate, args.retry_after)
+    runner = web.AppRunner(tg.app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, args.host, args.port).start()
+    print(f"Fake Bot API: http://{args.host}:{args.port}", flush=True)
+
+    if args.mode == "serve":
+        await asyncio.Event().wait()
+
+    if args.from_db:
+        users = await _load_users(args.users)
+    else:
+        users = [(USER_ID_BASE + i, f"code{i:012d}", None) for i in range(args.users)]
+
+    print("Bot kutilmoqda...", flush=True)
+    if args.mode == "polling":
+        await tg.polling_started.wait()
+    else:
+        await tg.webhook_set.wait()
+
+    load = Load(tg, args.mode, args.reply_timeout)
+    start = time.monotonic()
+    await load.run(users, args.concurrency, args.words.split(","))
+    report = {
+        "mode": args.mode,
+        "users": len(users),
+        "duration_s": round(time.monotonic() - start, 2),
+        **tg.report(),
+    }
+    if args.mode == "webhook":
+        report["webhook_post"] = summary(load.post_latency)
+        report["webhook_errors"] = dict(load.post_errors)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
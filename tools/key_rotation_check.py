@@ -0,0 +1,51 @@
+"""Kalit almashtirishni tekshirish (bazasiz): CARD_KEYS siz (1-versiya)
+shifrlangan kartalar CARD_KEYS="2:..." qo'yilgandan keyin ham ochilishi va
+qayta shifrlash (db._rotate_cards) ularni 2-versiyaga o'tkazishi kerak.
+
+    python -m tools.key_rotation_check
+"""
+import base64
+import os
+import sys
+
+os.environ.setdefault("ENCRYPTION_KEY", base64.urlsafe_b64encode(os.urandom(32)).decode())
+os.environ.pop("CARD_KEYS", None)
+
+import cipher
+import db
+
+CARDS = ["8600123412341234", "9860000011112222", "4000000000000002"]
+
+
+def main():
+    failures = 0
+
+    def check(ok: bool, message: str):
+        nonlocal failures
+        print(f"{'ok  ' if ok else 'FAIL'} {message}")
+        failures += not ok
+
+    old = cipher.CardCipher(cipher.config_from_env())
+    tokens = [old.encrypt(card) for card in CARDS]
+    check(old.current == 1, "CARD_KEYS siz joriy kalit — 1-versiya")
+
+    os.environ["CARD_KEYS"] = "2:" + base64.urlsafe_b64encode(os.urandom(32)).decode()
+    new = cipher.CardCipher(cipher.config_from_env())
+    check(new.current == 2 and 1 in new.keys, "CARD_KEYS=2:... — joriy 2, 1-versiya qoladi")
+    check([new.decrypt(t) for t in tokens] == CARDS, "eski tokenlar yangi sozlamada ochiladi")
+
+    db.card_cipher = new
+    rows = [{"id": i, "card_number": t} for i, t in enumerate(tokens, 1)]
+    updates = db._rotate_cards(rows)
+    check(len(updates) == len(CARDS), "hamma eski karta qayta shifrlandi (o'tkazib yuborilmadi)")
+    check(
+        all(new.is_current(token) and new.decrypt(token) == card
+            for (_, token, _, _), card in zip(updates, CARDS)),
+        "yangi tokenlar 2-versiyada va to'g'ri ochiladi",
+    )
+    check([last4 for *_, last4 in updates] == [c[-4:] for c in CARDS], "last4 to'g'ri")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+"""tools/ dagi o'lchovlar uchun umumiy yordamchilar"""
+import statistics
+
+
+def summary(samples: list[float]) -> dict:
+    """Sekundlar ro'yxatidan p50/p95/p99 (ms)"""
+    if not samples:
+        return {"n": 0}
+    # quantiles() kamida 2 ta qiymat talab qiladi
+    q = statistics.quantiles(samples * 2 if len(samples) == 1 else samples,
+                             n=100, method="inclusive")
+    return {
+        "n": len(samples),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 3),
+        "p50_ms": round(q[49] * 1000, 3),
+        "p95_ms": round(q[94] * 1000, 3),
+        "p99_ms": round(q[98] * 1000, 3),
+        "max_ms": round(max(samples) * 1000, 3),
+    }